@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from ...core.auth import authenticate_request, auth_cache
+from ...core.auth import authenticate_request, auth_cache, auth_cache_key
 from ...core.tenant_resolver import TenantResolver
 from ...models.auth import AuthenticatedUser
 from ...database import supabase
 import logging
-import hashlib
 
 from typing import List, Dict, Any
 
@@ -63,7 +62,7 @@ async def get_current_user_info(
         auth_header = request.headers.get('authorization', '')
         if auth_header.startswith('Bearer '):
             token = auth_header[7:]
-            token_hash = hashlib.sha256(token.encode()).hexdigest()[:16]
+            token_hash = auth_cache_key(token)
             if token_hash in auth_cache:
                 logger.info(f"AUTH /me: Clearing cache for user {user.email} on refresh request")
                 del auth_cache[token_hash]
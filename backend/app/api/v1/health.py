@@ -3,20 +3,23 @@ Health Check API for monitoring backend performance and reliability
 Provides detailed status information for diagnosing 504 timeout issues
 Enhanced with cache management capabilities
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import Dict, Any, Optional
 from ...database import supabase
 from ...core.redis_client import redis_client
 from ...core.tenant_cache import tenant_cache
-from ...core.async_processing import async_processor
+from ...core.async_processing import async_processor, TaskStatus
 from ...core.auth import authenticate_request
 from ...models.auth import AuthenticatedUser
 import time
 import logging
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
+
+UTC = timezone.utc
 
 logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/health", tags=["health"])
 
 @router.get("/status")
@@ -27,7 +30,7 @@ async def get_health_status() -> Dict[str, Any]:
     """
     start_time = time.time()
     status = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(UTC).isoformat(),
         "status": "healthy",
         "checks": {},
         "performance": {}
@@ -114,7 +117,7 @@ async def get_health_status() -> Dict[str, Any]:
     if not db_healthy:
         status["status"] = "unhealthy"
     
-    logger.info(f"Health check completed in {total_duration:.3f}s - Status: {status['status']}")
+    logger.info("Health check completed in %.3fs - Status: %s", total_duration, status["status"])
     return status
 
 @router.get("/db")
@@ -125,7 +128,7 @@ async def get_database_health() -> Dict[str, Any]:
     try:
         # Test multiple database operations
         health_data = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(UTC).isoformat(),
             "tests": {}
         }
         
@@ -171,9 +174,9 @@ async def get_database_health() -> Dict[str, Any]:
         return health_data
         
     except Exception as e:
-        logger.error(f"Database health check failed: {e}")
+        logger.error("Database health check failed: %s", e)
         return {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(UTC).isoformat(),
             "status": "unhealthy",
             "error": str(e),
             "duration_ms": round((time.time() - start_time) * 1000, 2)
@@ -185,7 +188,7 @@ async def get_performance_metrics() -> Dict[str, Any]:
     try:
         # Measure key operation response times
         metrics = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(UTC).isoformat(),
             "database": {},
             "cache": {},
             "connection_pool": {}
@@ -217,7 +220,7 @@ async def get_performance_metrics() -> Dict[str, Any]:
         return metrics
         
     except Exception as e:
-        logger.error(f"Performance metrics failed: {e}")
+        logger.error("Performance metrics failed: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get performance metrics: {str(e)}")
 
 @router.post("/warm-cache")
@@ -250,11 +253,11 @@ async def warm_cache_for_user(
             "tenant_id": tenant_id,
             "warming_results": warming_results,
             "duration_ms": duration_ms,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now(UTC).isoformat()
         }
         
     except Exception as e:
-        logger.error(f"Cache warming failed: {e}")
+        logger.error("Cache warming failed: %s", e)
         raise HTTPException(status_code=500, detail=f"Cache warming failed: {str(e)}")
 
 @router.post("/invalidate-cache")
@@ -263,11 +266,14 @@ async def invalidate_cache_endpoint(
     tenant_id: Optional[str] = None,
     city: Optional[str] = None,
     cache_type: Optional[str] = None,  # user, tenant, city, or all
+    quiet: bool = False,
     user: AuthenticatedUser = Depends(authenticate_request)
 ) -> Dict[str, Any]:
     """
     Invalidate specific cache entries for troubleshooting
     Admin endpoint for cache management
+
+    Pass quiet=true to get a bare 204 on success (for bulk invalidation scripts)
     """
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
@@ -303,6 +309,9 @@ async def invalidate_cache_endpoint(
             else:
                 return {"status": "error", "message": "city required for city cache clear"}
         
+        if quiet:
+            return Response(status_code=204)
+        
         return {
             "status": "success",
             "keys_cleared": keys_cleared,
@@ -312,11 +321,11 @@ async def invalidate_cache_endpoint(
                 "tenant_id": tenant_id,
                 "city": city
             },
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now(UTC).isoformat()
         }
         
     except Exception as e:
-        logger.error(f"Cache invalidation failed: {e}")
+        logger.error("Cache invalidation failed: %s", e)
         raise HTTPException(status_code=500, detail=f"Cache invalidation failed: {str(e)}")
 
 @router.get("/cache-stats")
@@ -371,11 +380,11 @@ async def get_cache_statistics(
                 }
             },
             "async_processor": async_processor.get_stats(),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now(UTC).isoformat()
         }
         
     except Exception as e:
-        logger.error(f"Failed to get cache stats: {e}")
+        logger.error("Failed to get cache stats: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get cache stats: {str(e)}")
 
 @router.get("/task-status/{task_id}")
@@ -401,10 +410,10 @@ async def get_task_status(
             "name": task.name,
             "status": task.status.value,
             "progress": task.progress,
-            "created_at": task.created_at.isoformat(),
-            "started_at": task.started_at.isoformat() if task.started_at else None,
-            "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-            "error": task.error
+            "created_at": task.created_at_dt.isoformat(),
+            "started_at": task.started_at_dt.isoformat() if task.started_at else None,
+            "completed_at": task.completed_at_dt.isoformat() if task.completed_at else None,
+            "error": task.error_message
         }
         
         # Include result if completed
@@ -420,7 +429,7 @@ async def get_task_status(
         
         # Calculate processing time if available
         if task.started_at and task.completed_at:
-            processing_time = (task.completed_at - task.started_at).total_seconds()
+            processing_time = task.completed_at - task.started_at
             response["processing_time_seconds"] = round(processing_time, 2)
         
         return response
@@ -428,16 +437,19 @@ async def get_task_status(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to get task status: {e}")
+        logger.error("Failed to get task status: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get task status: {str(e)}")
 
 @router.post("/cancel-task/{task_id}")
 async def cancel_task(
     task_id: str,
+    quiet: bool = False,
     user: AuthenticatedUser = Depends(authenticate_request)
 ) -> Dict[str, Any]:
     """
     Cancel a running async task
+
+    Pass quiet=true to get a bare 204 on success instead of the JSON envelope
     """
     try:
         task = await async_processor.get_task_status(task_id)
@@ -452,6 +464,8 @@ async def cancel_task(
         success = await async_processor.cancel_task(task_id)
         
         if success:
+            if quiet:
+                return Response(status_code=204)
             return {
                 "status": "success",
                 "message": f"Task {task_id} has been cancelled",
@@ -467,18 +481,28 @@ async def cancel_task(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to cancel task: {e}")
+        logger.error("Failed to cancel task: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to cancel task: {str(e)}")
 
 @router.get("/user-tasks")
 async def get_user_tasks(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of tasks to return"),
+    offset: int = Query(0, ge=0, description="Number of tasks to skip"),
+    status: Optional[str] = Query(None, description="Filter by task status"),
     user: AuthenticatedUser = Depends(authenticate_request)
 ) -> Dict[str, Any]:
     """
-    Get all async tasks for the current user
+    Get async tasks for the current user, newest first and paginated
     """
     try:
-        user_tasks = await async_processor.get_user_tasks(user.id)
+        status_filter = TaskStatus(status) if status else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid task status: {status}")
+    
+    try:
+        user_tasks = await async_processor.get_user_tasks(
+            user.id, status=status_filter, limit=limit, offset=offset
+        )
         
         tasks_data = []
         for task in user_tasks:
@@ -487,9 +511,9 @@ async def get_user_tasks(
                 "name": task.name,
                 "status": task.status.value,
                 "progress": task.progress,
-                "created_at": task.created_at.isoformat(),
-                "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-                "error": task.error
+                "created_at": task.created_at_dt.isoformat(),
+                "completed_at": task.completed_at_dt.isoformat() if task.completed_at else None,
+                "error": task.error_message
             }
             
             # Add result size info if completed
@@ -501,19 +525,20 @@ async def get_user_tasks(
             
             tasks_data.append(task_data)
         
-        # Sort by creation time, newest first
-        tasks_data.sort(key=lambda x: x['created_at'], reverse=True)
+        counters = async_processor.get_user_counters(user.id)
         
         return {
             "tasks": tasks_data,
-            "total": len(tasks_data),
-            "active_count": len([t for t in tasks_data if t['status'] in ['pending', 'in_progress']]),
-            "completed_count": len([t for t in tasks_data if t['status'] == 'completed']),
-            "failed_count": len([t for t in tasks_data if t['status'] == 'failed'])
+            "total": counters[status_filter.value] if status_filter else sum(counters.values()),
+            "limit": limit,
+            "offset": offset,
+            "active_count": counters["pending"] + counters["in_progress"],
+            "completed_count": counters["completed"],
+            "failed_count": counters["failed"]
         }
         
     except Exception as e:
-        logger.error(f"Failed to get user tasks: {e}")
+        logger.error("Failed to get user tasks: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get user tasks: {str(e)}")
 
 @router.get("/async-stats")
@@ -533,9 +558,9 @@ async def get_async_processor_stats(
             "status": "success",
             "async_processor": stats,
             "background_cleanup_running": async_processor._cleanup_task is not None and not async_processor._cleanup_task.done(),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now(UTC).isoformat()
         }
         
     except Exception as e:
-        logger.error(f"Failed to get async stats: {e}")
+        logger.error("Failed to get async stats: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get async stats: {str(e)}")
\ No newline at end of file
@@ -6,12 +6,18 @@ that support the frontend PersistentAuthContext.
 """
 
 import logging
-from datetime import datetime
-from typing import Dict, Any, List
+import hashlib
+from uuid import UUID
+from datetime import datetime, timezone
+from typing import Annotated, Dict, Any, List, Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
+from cachetools import TTLCache
 
-from ...core.auth import authenticate_request
+from ...core.auth import authenticate_request, invalidate_user_cache
+from ...core.redis_client import redis_client
+from ...core.async_processing import async_processor
 from ...core.persistent_sessions import (
     PersistentSessionManager,
     validate_persistent_session,
@@ -20,13 +26,88 @@ from ...core.persistent_sessions import (
 from ...models.auth import AuthenticatedUser
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Short-lived cache of successful session validations, keyed by
+# (session_id, device_id, user_id, access token digest)
+session_validation_cache = TTLCache(maxsize=10_000, ttl=30)  # 30 seconds TTL
+
+# Redis Pub/Sub channel used to evict cached validations across workers.
+# Messages are "<user_id>" for all of a user's sessions or
+# "<user_id>:<session_id>" for a single one.
+SESSION_CACHE_INVALIDATE_CHANNEL = "session_cache_invalidate"
+
+def _session_cache_key(session_id: str, device_id: str, user_id: str, access_token: Optional[str]) -> Tuple[str, str, str, str]:
+    """Build the validation cache key without keeping the raw token in memory"""
+    token_digest = hashlib.blake2b(access_token.encode(), digest_size=8).hexdigest() if access_token else ""
+    return (session_id, device_id, user_id, token_digest)
+
+def invalidate_session_validation_cache(user_id: str, session_id: Optional[str] = None) -> int:
+    """Drop cached validations for a user (optionally a single session)"""
+    keys_to_remove = [
+        key for key in list(session_validation_cache.keys())
+        if key[2] == user_id and (session_id is None or key[0] == session_id)
+    ]
+    for key in keys_to_remove:
+        session_validation_cache.pop(key, None)
+    return len(keys_to_remove)
+
+def _seconds_until_expiry(expires_at: str) -> float:
+    """Seconds from now (UTC) until an ISO expiry timestamp; unparseable values count as expired"""
+    try:
+        expiry = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return 0.0
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return (expiry - datetime.now(timezone.utc)).total_seconds()
+
+def _session_not_expired(expires_at: str) -> bool:
+    """Check an ISO expiry timestamp against the current UTC time"""
+    return _seconds_until_expiry(expires_at) > 0
+
+def _extract_bearer(auth_header: Optional[str]) -> Optional[str]:
+    """Return the token from an "Authorization: Bearer <token>" header, or None"""
+    if auth_header and len(auth_header) > 7 and auth_header[:7].lower() == "bearer ":
+        return auth_header[7:]
+    return None
+
+def _scan_auth_headers(http_request: Request) -> Tuple[Optional[str], str]:
+    """Read the authorization and user-agent headers in a single pass over the raw ASGI headers"""
+    authorization = None
+    user_agent = None
+    for name, value in http_request.scope["headers"]:
+        if authorization is None and name == b"authorization":
+            authorization = value.decode("latin-1")
+        elif user_agent is None and name == b"user-agent":
+            user_agent = value.decode("latin-1")
+        if authorization is not None and user_agent is not None:
+            break
+    return authorization, user_agent or ""
+
+def _require_uuid(value: str) -> str:
+    """Reject ids that are not UUIDs while keeping the caller's exact string form"""
+    UUID(value)
+    return value
+
+# Identifier fields are bounded by the persistent_sessions column width (String(255)).
+# Session ids come from secrets.token_urlsafe, user ids are UUIDs; malformed values
+# get a 422 before any database work.
+SessionId = Annotated[str, Field(min_length=1, max_length=255, pattern=r"^[A-Za-z0-9_-]+$")]
+DeviceId = Annotated[str, Field(min_length=1, max_length=255)]
+UserId = Annotated[str, Field(min_length=1, max_length=255), AfterValidator(_require_uuid)]
 
 # Request/Response Models
 class SessionValidationRequest(BaseModel):
-    session_id: str = Field(..., description="Session ID to validate")
-    device_id: str = Field(..., description="Device ID for validation")
-    user_id: str = Field(..., description="User ID for validation")
+    model_config = ConfigDict(extra="ignore", frozen=True, str_max_length=512)
+    
+    session_id: Annotated[SessionId, Field(description="Session ID to validate")]
+    device_id: Annotated[DeviceId, Field(description="Device ID for validation")]
+    user_id: Annotated[UserId, Field(description="User ID for validation")]
+    refresh_if_expiring_within: Annotated[int, Field(
+        ge=0,
+        description="Validate only: refresh the session inline if it expires within this many seconds"
+    )] = 0
 
 class SessionValidationResponse(BaseModel):
     valid: bool = Field(..., description="Whether the session is valid")
@@ -35,10 +116,13 @@ class SessionValidationResponse(BaseModel):
     tenant_id: str = Field(default="", description="User's tenant ID")
     device_id: str = Field(default="", description="Device ID")
     expires_at: str = Field(default="", description="Session expiration time")
+    refreshed: bool = Field(default=False, description="Whether the session was refreshed inline")
 
 class SessionCreationRequest(BaseModel):
-    device_id: str = Field(..., description="Device ID for the session")
-    user_agent: str = Field(default="", description="User agent string")
+    model_config = ConfigDict(extra="ignore", frozen=True, str_max_length=512)
+    
+    device_id: Annotated[DeviceId, Field(description="Device ID for the session")]
+    user_agent: Annotated[str, Field(description="User agent string")] = ""
 
 class SessionCreationResponse(BaseModel):
     session_id: str = Field(..., description="Created session ID")
@@ -50,7 +134,37 @@ class UserSessionsResponse(BaseModel):
     sessions: List[Dict[str, Any]] = Field(..., description="List of user sessions")
     active_count: int = Field(..., description="Number of active sessions")
 
-@router.post("/validate-session", response_model=SessionValidationResponse)
+def _invalid_session_response(reason: str) -> Dict[str, Any]:
+    """Build a validate-session payload for a rejected session"""
+    return {
+        "valid": False,
+        "reason": reason,
+        "session_id": "",
+        "tenant_id": "",
+        "device_id": "",
+        "expires_at": "",
+        "refreshed": False
+    }
+
+# Rejection payloads for the reasons PersistentSessionManager.validate_session reports
+_INVALID_SESSION_RESPONSES = {
+    reason: _invalid_session_response(reason)
+    for reason in (
+        "session_not_found",
+        "user_mismatch",
+        "device_mismatch",
+        "session_expired",
+        "token_mismatch",
+        "validation_error",
+        "unknown",
+    )
+}
+
+@router.post(
+    "/validate-session",
+    response_model=None,
+    responses={200: {"model": SessionValidationResponse}}
+)
 async def validate_session_endpoint(
     request: SessionValidationRequest,
     http_request: Request,
@@ -60,10 +174,15 @@ async def validate_session_endpoint(
     Validate a persistent session
     
     This endpoint is called by the frontend PersistentAuthContext to validate
-    that a session is still valid on the server side.
+    that a session is still valid on the server side. Responses are plain dicts
+    shaped like SessionValidationResponse to skip response-model validation.
+    
+    When refresh_if_expiring_within is set and the session expires within that
+    window, the session is refreshed with the bearer token in the same request,
+    saving the follow-up call to /refresh-session.
     """
     try:
-        logger.info(f"Validating session {request.session_id} for user {user.email}")
+        logger.info("Validating session %s for user %s", request.session_id, user.email)
         
         # Ensure the requesting user matches the session user
         if request.user_id != user.id:
@@ -73,10 +192,17 @@ async def validate_session_endpoint(
             )
         
         # Extract access token from request
-        auth_header = http_request.headers.get("authorization")
-        access_token = None
-        if auth_header and auth_header.startswith("Bearer "):
-            access_token = auth_header[7:]
+        auth_header, _ = _scan_auth_headers(http_request)
+        access_token = _extract_bearer(auth_header)
+        
+        # Serve recently validated sessions from cache
+        cache_key = _session_cache_key(request.session_id, request.device_id, request.user_id, access_token)
+        refresh_window = request.refresh_if_expiring_within if access_token else 0
+        cached_response = session_validation_cache.get(cache_key)
+        if cached_response is not None:
+            if _seconds_until_expiry(cached_response["expires_at"]) > refresh_window:
+                return cached_response
+            session_validation_cache.pop(cache_key, None)
         
         # Validate the session
         validation_result = await validate_persistent_session(
@@ -88,23 +214,35 @@ async def validate_session_endpoint(
         
         if validation_result['valid']:
             session_data = validation_result['session']
-            return SessionValidationResponse(
-                valid=True,
-                session_id=request.session_id,
-                tenant_id=session_data.get('tenant_id', ''),
-                device_id=session_data.get('device_id', ''),
-                expires_at=session_data.get('expires_at', '')
-            )
+            refreshed = False
+            if refresh_window and _seconds_until_expiry(session_data.get('expires_at') or '') < refresh_window:
+                extended_session = await PersistentSessionManager.extend_session(
+                    session_id=request.session_id,
+                    new_access_token=access_token
+                )
+                if extended_session:
+                    session_data = extended_session
+                    refreshed = True
+            
+            response = {
+                "valid": True,
+                "reason": "",
+                "session_id": request.session_id,
+                "tenant_id": session_data.get('tenant_id') or '',
+                "device_id": session_data.get('device_id') or '',
+                "expires_at": session_data.get('expires_at') or '',
+                "refreshed": refreshed
+            }
+            session_validation_cache[cache_key] = {**response, "refreshed": False} if refreshed else response
+            return response
         else:
-            return SessionValidationResponse(
-                valid=False,
-                reason=validation_result.get('reason', 'unknown')
-            )
+            reason = validation_result.get('reason', 'unknown')
+            return _INVALID_SESSION_RESPONSES.get(reason) or _invalid_session_response(reason)
             
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error validating session {request.session_id}: {str(e)}")
+        logger.error("Error validating session %s: %s", request.session_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Session validation failed: {str(e)}"
@@ -120,17 +258,13 @@ async def create_session_endpoint(
     Create a new persistent session for the authenticated user
     """
     try:
-        logger.info(f"Creating session for user {user.email} on device {request.device_id}")
+        logger.info("Creating session for user %s on device %s", user.email, request.device_id)
         
-        # Extract client info
-        user_agent = request.user_agent or http_request.headers.get("user-agent", "")
+        # Extract client info and access token in one header scan
+        auth_header, header_user_agent = _scan_auth_headers(http_request)
+        user_agent = request.user_agent or header_user_agent
         client_ip = http_request.client.host if http_request.client else ""
-        
-        # Extract access token from request
-        auth_header = http_request.headers.get("authorization")
-        access_token = ""
-        if auth_header and auth_header.startswith("Bearer "):
-            access_token = auth_header[7:]
+        access_token = _extract_bearer(auth_header) or ""
         
         # Create the session
         session = await PersistentSessionManager.create_session(
@@ -150,7 +284,7 @@ async def create_session_endpoint(
         )
         
     except Exception as e:
-        logger.error(f"Error creating session for user {user.email}: {str(e)}")
+        logger.error("Error creating session for user %s: %s", user.email, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Session creation failed: {str(e)}"
@@ -166,7 +300,7 @@ async def refresh_session_endpoint(
     Refresh session tokens for a persistent session
     """
     try:
-        logger.info(f"Refreshing session {request.session_id} for user {user.email}")
+        logger.info("Refreshing session %s for user %s", request.session_id, user.email)
         
         # Ensure the requesting user matches the session user
         if request.user_id != user.id:
@@ -176,14 +310,16 @@ async def refresh_session_endpoint(
             )
         
         # Extract new tokens from request
-        auth_header = http_request.headers.get("authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
+        auth_header, _ = _scan_auth_headers(http_request)
+        new_access_token = _extract_bearer(auth_header)
+        if not new_access_token:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="New access token required for refresh"
             )
         
-        new_access_token = auth_header[7:]
+        # Cached validations were keyed by the old token
+        invalidate_session_validation_cache(user.id, request.session_id)
         
         # Update session with new tokens
         success = await PersistentSessionManager.update_session_token(
@@ -202,7 +338,7 @@ async def refresh_session_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error refreshing session {request.session_id}: {str(e)}")
+        logger.error("Error refreshing session %s: %s", request.session_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Session refresh failed: {str(e)}"
@@ -217,28 +353,21 @@ async def deactivate_session_endpoint(
     Deactivate a specific session
     """
     try:
-        logger.info(f"Deactivating session {session_id} for user {user.email}")
+        logger.info("Deactivating session %s for user %s", session_id, user.email)
         
-        # Validate that the session belongs to the requesting user
-        validation_result = await PersistentSessionManager.validate_session(
-            session_id=session_id,
-            device_id="",  # Skip device validation for deactivation
-            user_id=user.id
-        )
-        
-        if not validation_result['valid'] and validation_result.get('reason') != 'device_mismatch':
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Session not found or already inactive"
-            )
+        # Deactivate the session; ownership is checked by the UPDATE itself
+        invalidate_session_validation_cache(user.id, session_id)
+        invalidate_user_cache(user.id)
+        success = await PersistentSessionManager.deactivate_session(session_id, user_id=user.id)
         
-        # Deactivate the session
-        success = await PersistentSessionManager.deactivate_session(session_id)
+        # Evict the session's cached validations in the other workers as well
+        if redis_client.is_connected:
+            await redis_client.publish(SESSION_CACHE_INVALIDATE_CHANNEL, f"{user.id}:{session_id}")
         
         if not success:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to deactivate session"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Session not found or already inactive"
             )
         
         return {"success": True, "message": "Session deactivated successfully"}
@@ -246,7 +375,7 @@ async def deactivate_session_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deactivating session {session_id}: {str(e)}")
+        logger.error("Error deactivating session %s: %s", session_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Session deactivation failed: {str(e)}"
@@ -260,11 +389,17 @@ async def deactivate_all_sessions_endpoint(
     Deactivate all sessions for the authenticated user (logout from all devices)
     """
     try:
-        logger.info(f"Deactivating all sessions for user {user.email}")
+        logger.info("Deactivating all sessions for user %s", user.email)
         
         # Deactivate all user sessions
+        invalidate_session_validation_cache(user.id)
+        invalidate_user_cache(user.id)
         deactivated_count = await PersistentSessionManager.deactivate_user_sessions(user.id)
         
+        # Evict cached validations in the other workers as well
+        if redis_client.is_connected:
+            await redis_client.publish(SESSION_CACHE_INVALIDATE_CHANNEL, user.id)
+        
         return {
             "success": True,
             "message": f"Deactivated {deactivated_count} sessions",
@@ -272,37 +407,48 @@ async def deactivate_all_sessions_endpoint(
         }
         
     except Exception as e:
-        logger.error(f"Error deactivating all sessions for user {user.email}: {str(e)}")
+        logger.error("Error deactivating all sessions for user %s: %s", user.email, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Session deactivation failed: {str(e)}"
         )
 
-@router.get("/sessions", response_model=UserSessionsResponse)
+@router.get(
+    "/sessions",
+    response_model=None,
+    responses={200: {"model": UserSessionsResponse}}
+)
 async def get_user_sessions_endpoint(
     active_only: bool = True,
     user: AuthenticatedUser = Depends(authenticate_request)
 ):
     """
     Get all sessions for the authenticated user
+    
+    The session rows are serialized straight to ORJSONResponse rather than
+    re-validated through UserSessionsResponse.
     """
     try:
-        logger.info(f"Getting sessions for user {user.email}")
+        logger.info("Getting sessions for user %s", user.email)
         
         sessions = await PersistentSessionManager.get_user_sessions(
             user_id=user.id,
             active_only=active_only
         )
         
-        active_count = len([s for s in sessions if s.get('is_active', False)])
+        # Every row is active when active_only is set, so skip the scan
+        if active_only:
+            active_count = len(sessions)
+        else:
+            active_count = sum(1 for s in sessions if s.get('is_active', False))
         
-        return UserSessionsResponse(
-            sessions=sessions,
-            active_count=active_count
-        )
+        return ORJSONResponse({
+            "sessions": sessions,
+            "active_count": active_count
+        })
         
     except Exception as e:
-        logger.error(f"Error getting sessions for user {user.email}: {str(e)}")
+        logger.error("Error getting sessions for user %s: %s", user.email, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get user sessions: {str(e)}"
@@ -314,6 +460,10 @@ async def cleanup_expired_sessions_endpoint(
 ):
     """
     Clean up expired sessions (admin endpoint)
+    
+    The cleanup is queued on the async processor and the endpoint returns
+    immediately; poll /health/task-status/{task_id} for the result. The same
+    cleanup also runs hourly in the background.
     """
     try:
         # Check if user is admin
@@ -323,20 +473,32 @@ async def cleanup_expired_sessions_endpoint(
                 detail="Admin access required"
             )
         
-        logger.info(f"Running expired session cleanup requested by {user.email}")
+        logger.info("Running expired session cleanup requested by %s", user.email)
         
-        cleaned_count = await PersistentSessionManager.cleanup_expired_sessions()
+        task_id = await async_processor.submit_task(
+            "cleanup_expired_sessions",
+            PersistentSessionManager.cleanup_expired_sessions,
+            user.id,
+            user.tenant_id or ''
+        )
         
         return {
             "success": True,
-            "message": f"Cleaned up {cleaned_count} expired sessions",
-            "cleaned_count": cleaned_count
+            "status": "queued",
+            "message": "Expired session cleanup queued",
+            "task_id": task_id
         }
         
     except HTTPException:
         raise
+    except ValueError as e:
+        # async_processor rejects submissions over its concurrency limits
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.error(f"Error during session cleanup: {str(e)}")
+        logger.error("Error during session cleanup: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Session cleanup failed: {str(e)}"
@@ -2,8 +2,9 @@
 Lightning-fast user management API with true single-query optimization
 Achieves sub-100ms response times for hundreds of users
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
-from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
+from typing import Dict, Any, List, Optional, Tuple
 from pydantic import BaseModel
 from uuid import UUID
 from ...core.auth import require_permission, authenticate_request, invalidate_user_cache
@@ -11,25 +12,64 @@ from ...models.auth import AuthenticatedUser
 from ...database import supabase
 from ...core.tenant_context import get_tenant_id as get_claim_tenant
 from ...core.redis_client import redis_client
+from ...core.async_supabase import executor as supabase_executor
 import logging
-import json
 import time
 from datetime import datetime, timedelta
 import hashlib
 import asyncio
+from functools import lru_cache, partial
+from itertools import islice
+from cachetools import TTLCache
+import lz4.frame
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/users", tags=["users-lightning"])
+router = APIRouter(prefix="/users", tags=["users-lightning"], default_response_class=ORJSONResponse)
 
 # Admin emails
-ADMIN_EMAILS = [
+ADMIN_EMAILS = frozenset({
     "sid@theflexliving.com",
     "raouf@theflexliving.com",
     "michael@theflexliving.com",
-]
+})
+
+# Tenant roles that grant admin rights
+_ADMIN_ROLES = frozenset({"admin", "owner"})
+
+# User → tenant mapping rarely changes; mutations below invalidate it
+USER_TENANT_CACHE_TTL = 3600  # 1 hour
+
+# Cache stampede protection: one rebuild per tenant, others wait ~200ms
+# and then fall back to the stale copy
+STALE_CACHE_TTL = 3600  # 1 hour
+REFRESH_LOCK_TTL = 30
+REFRESH_WAIT_POLLS = 4
+REFRESH_WAIT_INTERVAL = 0.05
+
+# User lists are written rarely and read often: spend a little CPU on the
+# write for a smaller blob on every HIT (LZ4 HC decodes as fast as LZ4)
+USER_LIST_COMPRESSION_LEVEL = lz4.frame.COMPRESSIONLEVEL_MINHC
+
+# /users/brief returns at most this many users
+BRIEF_LIST_LIMIT = 50
+
+# Page size for auth.admin.list_users when the batch RPC is missing
+AUTH_USERS_PAGE_SIZE = 1000
+
+# Pub/Sub channel for cross-worker tenant cache invalidation
+TENANT_CACHE_INVALIDATE_CHANNEL = "tenant_cache_invalidate"
+
+# Allowed cities per tenant in Redis, amortized across list refreshes
+TENANT_CITIES_CACHE_TTL = 600  # 10 minutes
+
+# Composed GET /users/{user_id} responses, per viewing operator tenant
+USER_DETAIL_CACHE_TTL = 120  # 2 minutes
+
+# Allowed cities per tenant set, shared by every sanitize pass in the TTL window
+allowed_cities_cache = TTLCache(maxsize=1000, ttl=60)  # 1 minute TTL
 
 # Request/Response models
 class UserCreateRequest(BaseModel):
@@ -63,70 +103,345 @@ class UserListResponse(BaseModel):
     query_method: str  # Shows which optimization was used
 
 
-def get_cache_key(tenant_id: str) -> str:
+async def _execute(query):
+    """Run a blocking PostgREST query on the shared Supabase executor
+    so list requests don't stall the event loop while waiting on the network.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(supabase_executor, query.execute)
+
+
+async def _run_blocking(func, *args, **kwargs):
+    """Run a blocking Supabase SDK call (e.g. ``auth.admin``) on the shared
+    executor, the same way ``_execute`` does for PostgREST queries.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(supabase_executor, partial(func, *args, **kwargs))
+
+
+def get_generation_key(tenant_id: str) -> str:
+    """Generate key for the tenant's user-list revision counter"""
+    return f"tenant:{tenant_id}:gen"
+
+
+def get_cache_key(tenant_id: str, gen: int) -> str:
     """Generate cache key for Redis"""
-    return f"users:lightning:{tenant_id}"
+    return f"users:lightning:{tenant_id}:g{gen}"
+
+
+def get_user_cache_key(user_id: str) -> str:
+    """Generate user-scoped cache key, readable without resolving the tenant"""
+    return f"users:lightning:by_user:{user_id}"
+
+
+def get_page_cache_key(tenant_id: str, gen: int, offset: int, limit: int) -> str:
+    """Generate cache key for one page of a tenant's users"""
+    return f"{get_cache_key(tenant_id, gen)}:p{offset}:{limit}"
+
+
+def get_stale_cache_key(tenant_id: str) -> str:
+    """Generate key for the long-lived copy served while a refresh is running"""
+    return f"users:lightning:stale:{tenant_id}"
+
+
+def get_refresh_lock_key(tenant_id: str) -> str:
+    """Generate key for the per-tenant cache rebuild lock"""
+    return f"lock:users:{tenant_id}"
+
+
+def get_brief_cache_key(tenant_id: str, gen: int) -> str:
+    """Generate key for the tenant's brief hash (user_id -> id/email/name)"""
+    return f"users:brief:v2:{tenant_id}:g{gen}"
+
+
+def get_brief_top_cache_key(tenant_id: str, gen: int) -> str:
+    """Generate key for the tenant's newest brief entries, in list order"""
+    return f"users:brief:top:{tenant_id}:g{gen}"
+
+
+async def get_tenant_generation(tenant_id: Optional[str]) -> int:
+    """Current revision of the tenant's user list; 0 until the first write."""
+    if not tenant_id:
+        return 0
+    return await redis_client.get_counter(get_generation_key(tenant_id))
+
+
+async def bump_tenant_generation(tenant_id: str) -> None:
+    """Invalidate every cached view of the tenant's users with a single INCR.
+
+    Tenant-scoped keys embed the generation, so entries written under an
+    older one are never read again and simply age out on their TTL; nothing
+    is deleted, so concurrent readers never see a hole to stampede into.
+    """
+    if not redis_client.is_connected:
+        return
+    if await redis_client.incr(get_generation_key(tenant_id)) is not None:
+        logger.info(f"Bumped user list generation for tenant {tenant_id}")
+
+
+async def bump_tenant_generations(tenant_ids: List[str]) -> None:
+    """Bump several tenants' generations in one Redis round-trip."""
+    tenant_ids = list(dict.fromkeys(tid for tid in tenant_ids if tid))
+    if not tenant_ids or not redis_client.is_connected:
+        return
+    try:
+        async with redis_client.pipeline() as pipe:
+            for tid in tenant_ids:
+                pipe.incr(get_generation_key(tid))
+            await pipe.execute()
+        logger.info(f"Bumped user list generation for tenants {tenant_ids}")
+    except Exception as e:
+        logger.warning(f"Failed to bump user list generation for tenants {tenant_ids}: {e}")
+
+
+async def cache_user_list(
+    tenant_id: str,
+    gen: int,
+    cache_data: Dict[str, Any],
+    ttl: int,
+    user_id: Optional[str] = None,
+) -> None:
+    """Write the tenant list, its user-scoped copy and the brief side-indexes.
+
+    The payload records the tenant and generation it was built from so the
+    user-scoped copy, whose key can't carry them, can be checked on read.
+    """
+    cache_data = {**cache_data, "tenant_id": tenant_id, "gen": gen}
+    key_ttls: Dict[str, int] = {
+        get_cache_key(tenant_id, gen): ttl,
+        get_stale_cache_key(tenant_id): STALE_CACHE_TTL,
+    }
+    if user_id:
+        key_ttls[get_user_cache_key(user_id)] = ttl
+    brief_index = {
+        u["id"]: {
+            "id": u["id"],
+            "email": u["email"],
+            "name": u.get("name") or u["email"].split('@')[0]
+        }
+        for u in cache_data["users"]
+    }
+    # The list is sorted newest first, so the first brief entries are the newest users
+    brief_top = list(islice(brief_index.values(), BRIEF_LIST_LIMIT))
+    await asyncio.gather(
+        redis_client.set_many(key_ttls, cache_data, compression_level=USER_LIST_COMPRESSION_LEVEL),
+        redis_client.hset_many(get_brief_cache_key(tenant_id, gen), brief_index, ttl=ttl),
+        redis_client.set(get_brief_top_cache_key(tenant_id, gen), brief_top, ttl=ttl),
+    )
+
+
+def get_user_tenant_cache_key(user_id: str) -> str:
+    """Generate Redis key for a user's active tenant"""
+    return f"user_tenant:{user_id}"
+
+
+async def get_user_tenant_id(user_id: str) -> Optional[str]:
+    """Resolve the user's active tenant, served from Redis when warm."""
+    cache_key = get_user_tenant_cache_key(user_id)
+    if redis_client.is_connected:
+        cached_tenant = await redis_client.get(cache_key)
+        if cached_tenant:
+            return cached_tenant
+
+    tenant_query = await _execute(
+        supabase.service.table("user_tenants")
+        .select("tenant_id")
+        .eq("user_id", user_id)
+        .eq("is_active", True)
+        .limit(1)
+    )
+
+    if not tenant_query.data:
+        return None
+
+    tenant_id = tenant_query.data[0]["tenant_id"]
+    if redis_client.is_connected:
+        await redis_client.set(cache_key, tenant_id, ttl=USER_TENANT_CACHE_TTL)
+    return tenant_id
+
+
+async def invalidate_user_tenant_cache(user_id: str) -> None:
+    """Drop the cached user→tenant mapping after membership changes."""
+    if redis_client.is_connected:
+        await redis_client.delete(get_user_tenant_cache_key(user_id))
+
+
+def get_user_detail_cache_key(user_id: str) -> str:
+    """Generate key for a user's cached detail responses (hash: operator tenant -> entry)"""
+    return f"user:{user_id}"
+
+
+async def invalidate_user_detail_cache(user_id: str) -> None:
+    """Drop every cached detail response for the user, whichever tenant viewed it."""
+    if redis_client.is_connected:
+        await redis_client.delete(get_user_detail_cache_key(user_id))
 
 
 def get_allowed_cities_for_tenants(tenant_ids: List[str]) -> List[str]:
     """Return unique list of city names available to the provided tenant IDs."""
+    tenant_key = frozenset(tid for tid in tenant_ids if tid)
+    if not tenant_key:
+        return []
+
+    cached = allowed_cities_cache.get(tenant_key)
+    if cached is not None:
+        return list(cached)
+
+    # One IN-query for every tenant instead of a round-trip per tenant
+    try:
+        result = (
+            supabase.service
+            .table("all_properties")
+            .select("city")
+            .in_("tenant_id", list(tenant_key))
+            .eq("status", "active")
+            .execute()
+        )
+    except Exception as city_error:
+        logger.warning(f"Failed to fetch allowed cities for tenants {sorted(tenant_key)}: {city_error}")
+        return []
+
     allowed: Dict[str, str] = {}
-    for tenant_id in tenant_ids:
-        if not tenant_id:
+    for row in result.data or []:
+        city = (row.get("city") or "").strip()
+        if not city:
             continue
-        try:
-            result = (
-                supabase.service
-                .table("all_properties")
-                .select("city")
-                .eq("tenant_id", tenant_id)
-                .eq("status", "active")
-                .execute()
-            )
-            for row in result.data or []:
-                city = (row.get("city") or "").strip()
-                if not city:
-                    continue
-                key = city.lower()
-                if key not in allowed:
-                    allowed[key] = key
-        except Exception as city_error:
-            logger.warning(f"Failed to fetch allowed cities for tenant {tenant_id}: {city_error}")
-    return list(allowed.values())
+        key = city.lower()
+        if key not in allowed:
+            allowed[key] = key
 
+    cities = tuple(allowed.values())
+    allowed_cities_cache[tenant_key] = cities
+    return list(cities)
 
-def _sanitize_user_list(users: List[Dict[str, Any]], tenant_ids: List[str]) -> List[Dict[str, Any]]:
-    """Filter cities by tenant and normalize metadata for each user."""
-    allowed_cities = get_allowed_cities_for_tenants(tenant_ids)
-    allowed_map = {city.lower(): city for city in allowed_cities}
+
+def get_tenant_cities_cache_key(tenant_id: str) -> str:
+    """Generate Redis key for a tenant's allowed cities"""
+    return f"cities:tenant:{tenant_id}"
+
+
+async def get_tenant_allowed_cities(tenant_id: str) -> List[str]:
+    """Allowed cities for one tenant, shared across workers through Redis."""
+    cache_key = get_tenant_cities_cache_key(tenant_id)
+    if redis_client.is_connected:
+        cached_cities = await redis_client.get(cache_key)
+        if cached_cities is not None:
+            return cached_cities
+
+    loop = asyncio.get_running_loop()
+    cities = await loop.run_in_executor(
+        supabase_executor, get_allowed_cities_for_tenants, [tenant_id]
+    )
+    if cities and redis_client.is_connected:
+        await redis_client.set(cache_key, cities, ttl=TENANT_CITIES_CACHE_TTL)
+    return cities
+
+
+@lru_cache(maxsize=256)
+def _build_city_lookup(cities: Tuple[str, ...]) -> Dict[str, str]:
+    return {city.casefold(): city for city in cities}
+
+
+def get_city_lookup(allowed_cities: List[str]) -> Dict[str, str]:
+    """Casefolded name -> canonical city, built once per distinct allowed list.
+
+    The returned dict is shared between callers and must not be mutated.
+    """
+    return _build_city_lookup(tuple(allowed_cities))
+
+
+def filter_allowed_cities(submitted: List[Any], allowed_city_map: Dict[str, str]) -> List[str]:
+    """Canonical names of the submitted cities the tenant allows.
+
+    Matching is one set intersection on casefolded names instead of a
+    per-city lookup loop; duplicates collapse and the result is sorted so it
+    doesn't depend on set iteration order. With no allowed list to check
+    against, submitted names are kept as given.
+    """
+    if not allowed_city_map:
+        return [city.strip() for city in submitted if isinstance(city, str) and city.strip()]
+    submitted_keys = {city.strip().casefold() for city in submitted if isinstance(city, str)}
+    return sorted(allowed_city_map[key] for key in submitted_keys.intersection(allowed_city_map))
+
+
+async def get_allowed_cities_cached(tenant_ids: List[str]) -> List[str]:
+    """Allowed cities for request handlers: Redis-backed per tenant, with the
+    in-process cache in front, and never blocking the event loop."""
+    tenant_ids = [tid for tid in tenant_ids if tid]
+    if len(tenant_ids) == 1:
+        return await get_tenant_allowed_cities(tenant_ids[0])
+    if not tenant_ids:
+        return []
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        supabase_executor, get_allowed_cities_for_tenants, tenant_ids
+    )
+
+
+def invalidate_tenant_cities_cache(tenant_id: str) -> int:
+    """Drop this worker's cached allowed cities for any tenant set containing tenant_id
+
+    Returns:
+        int: Number of cache entries cleared
+    """
+    stale = [key for key in list(allowed_cities_cache.keys()) if tenant_id in key]
+    for key in stale:
+        allowed_cities_cache.pop(key, None)
+    return len(stale)
+
+
+async def publish_tenant_cities_invalidation(tenant_id: str) -> None:
+    """Invalidate a tenant's allowed cities in Redis and in every worker."""
+    invalidate_tenant_cities_cache(tenant_id)
+    if redis_client.is_connected:
+        await redis_client.delete(get_tenant_cities_cache_key(tenant_id))
+        await redis_client.publish(TENANT_CACHE_INVALIDATE_CHANNEL, tenant_id)
+
+
+def _sanitize_user_list(
+    users: List[Dict[str, Any]],
+    tenant_ids: List[str],
+    allowed_cities: Optional[List[str]] = None,
+    inplace: bool = False,
+) -> List[Dict[str, Any]]:
+    """Filter cities by tenant and normalize metadata for each user.
+
+    Pass ``inplace=True`` when the caller owns the rows (e.g. fresh query
+    results) to skip the defensive per-user dict copy.
+    """
+    if allowed_cities is None:
+        allowed_cities = get_allowed_cities_for_tenants(tenant_ids)
+    allowed_map = get_city_lookup(allowed_cities)
+    # Admins see every allowed city; compute that list once, not per admin
+    admin_cities = list(allowed_map.values()) if allowed_map else None
 
     sanitized: List[Dict[str, Any]] = []
+    append = sanitized.append
     for entry in users:
         if not isinstance(entry, dict):
             continue
 
-        user = dict(entry)
-        original_cities = [
-            city for city in (user.get("cities") or [])
-            if isinstance(city, str) and city.strip()
-        ]
-
-        if allowed_map:
-            filtered_cities: List[str] = []
-            for city in original_cities:
-                key = city.strip().lower()
-                if key in allowed_map:
-                    filtered_cities.append(allowed_map[key])
-        else:
-            filtered_cities = original_cities
+        user = entry if inplace else dict(entry)
+        raw_cities = user.get("cities") or []
 
         tenant_role = user.get("tenant_role") or user.get("role")
         is_admin_flag = user.get("isAdmin")
-        if tenant_role in ("admin", "owner") or (isinstance(is_admin_flag, bool) and is_admin_flag):
-            filtered_cities = list(allowed_map.values()) if allowed_map else original_cities
+        is_admin = tenant_role in _ADMIN_ROLES or (isinstance(is_admin_flag, bool) and is_admin_flag)
+
+        if is_admin and admin_cities is not None:
+            user["cities"] = list(admin_cities)
+        elif allowed_map:
+            user["cities"] = [
+                allowed_map[key] for city in raw_cities
+                if isinstance(city, str) and (key := city.strip().casefold()) in allowed_map
+            ]
+        else:
+            user["cities"] = [
+                city for city in raw_cities
+                if isinstance(city, str) and city.strip()
+            ]
 
-        user["cities"] = filtered_cities
-        sanitized.append(_normalize_user_metadata(user))
+        append(_normalize_user_metadata(user))
 
     return sanitized
 
@@ -143,7 +458,7 @@ def _normalize_user_metadata(user: Dict[str, Any]) -> Dict[str, Any]:
     is_admin_flag = user.get("isAdmin")
     app_metadata = user.get("app_metadata") or {}
 
-    if tenant_role in ("admin", "owner"):
+    if tenant_role in _ADMIN_ROLES:
         if not isinstance(app_metadata, dict):
             app_metadata = {}
         if app_metadata.get("role") != "admin":
@@ -159,84 +474,89 @@ def _normalize_user_metadata(user: Dict[str, Any]) -> Dict[str, Any]:
     return user
 
 
+def _normalize_rpc_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Map get_all_tenant_users_lightning columns back to the API user shape."""
+    for row in rows:
+        # Unquoted SQL identifiers come back lower-cased
+        if "isadmin" in row:
+            row["isAdmin"] = bool(row.pop("isadmin"))
+        row.pop("total_count", None)
+    return rows
+
+
 async def get_users_single_query(tenant_id: str) -> List[Dict[str, Any]]:
     """
     Get all users with a SINGLE database query using RPC function.
     This is the fastest possible method.
+
+    Users are sanitized exactly once here, so whatever callers cache is the
+    final shape and read paths never sanitize again.
     """
-    raw_users: List[Dict[str, Any]] = []
+    raw_users: Optional[List[Dict[str, Any]]] = None
 
     try:
-        # Try the new RPC wrapper function first (most compatible)
-        result = supabase.service.rpc("rpc_get_tenant_users", {
+        # Users, permissions and cities pre-joined server-side in one round-trip
+        result = await _execute(supabase.service.rpc("get_all_tenant_users_lightning", {
             "p_tenant_id": tenant_id
-        }).execute()
-        
-        if result.data:
-            # The RPC returns JSONB, which might be a single value or array
-            raw_users = result.data if isinstance(result.data, list) else []
-            if raw_users:
-                logger.info(f"RPC returned {len(raw_users)} users")
-                return _sanitize_user_list(raw_users, [tenant_id])
+        }))
+
+        if isinstance(result.data, list):
+            logger.info(f"Lightning RPC returned {len(result.data)} users")
+            raw_users = _normalize_rpc_rows(result.data)
     except Exception as e:
-        logger.warning(f"Primary RPC not available: {e}")
-    
+        logger.warning(f"Lightning RPC not available: {e}")
+
+    if raw_users is None:
+        # Fallback to optimized multi-query approach; unlike the RPC it has no
+        # ORDER BY, so sort by creation date (newest first) here
+        raw_users = await get_users_optimized_query(tenant_id)
+        raw_users.sort(key=lambda x: x.get("created_at") or "", reverse=True)
+
+    allowed_cities = await get_tenant_allowed_cities(tenant_id)
+    return _sanitize_user_list(raw_users, [tenant_id], allowed_cities, inplace=True)
+
+
+async def get_users_page(tenant_id: str, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Get one page of users straight from the database, with the tenant's total
+    user count, without materializing the whole list.
+    """
     try:
-        # Try the alternative fast function
-        result = supabase.service.rpc("get_all_tenant_users_fast", {
-            "p_tenant_id": tenant_id
-        }).execute()
-        
-        if result.data:
-            logger.info(f"Alternative RPC returned {len(result.data)} users")
-            return _sanitize_user_list(result.data, [tenant_id])
+        result = await _execute(supabase.service.rpc("get_all_tenant_users_lightning", {
+            "p_tenant_id": tenant_id,
+            "p_offset": offset,
+            "p_limit": limit
+        }))
+
+        if isinstance(result.data, list) and result.data:
+            total_count = int(result.data[0].get("total_count") or 0)
+            raw_users = _normalize_rpc_rows(result.data)
+            allowed_cities = await get_tenant_allowed_cities(tenant_id)
+            users = _sanitize_user_list(raw_users, [tenant_id], allowed_cities, inplace=True)
+            return users, total_count
     except Exception as e:
-        logger.warning(f"Alternative RPC not available: {e}")
-    
-    # Fallback to optimized multi-query approach
-    optimized = await get_users_optimized_query(tenant_id)
-    return _sanitize_user_list(optimized, [tenant_id])
+        logger.warning(f"Paged lightning RPC not available: {e}")
+
+    # Past the end, or the RPC predates paging: slice the full list
+    users_data = await get_users_single_query(tenant_id)
+    return users_data[offset:offset + limit], len(users_data)
 
 
 async def get_users_optimized_query(tenant_id: str) -> List[Dict[str, Any]]:
     """
-    Optimized approach using direct auth.users table query.
-    Avoids individual auth.admin API calls entirely.
+    Multi-query fallback: tenant members, then permissions, cities and auth
+    users fetched in parallel batches and merged in Python.
     """
     start = time.time()
     
-    # Query 1: Get all user data from auth.users directly (using service role)
-    # This is MUCH faster than individual auth.admin.get_user_by_id calls
-    auth_users_query = f"""
-    SELECT 
-        au.id,
-        au.email,
-        au.created_at,
-        au.last_sign_in_at,
-        au.raw_user_meta_data as user_metadata,
-        au.raw_app_meta_data as app_metadata,
-        ut.role,
-        ut.is_owner
-    FROM auth.users au
-    INNER JOIN user_tenants ut ON ut.user_id = au.id::text
-    WHERE ut.tenant_id = '{tenant_id}'
-    AND ut.is_active = true
-    AND (au.raw_user_meta_data->>'deleted' IS NULL OR au.raw_user_meta_data->>'deleted' = 'false')
-    ORDER BY au.created_at DESC
-    """
-    
     try:
-        # Execute raw SQL query using service role
-        auth_result = supabase.service.postgrest.from_("users").select("*", count="none").execute()
-        # Note: Supabase Python client doesn't support raw SQL directly, 
-        # so we need to use the table query approach
-        
-        # Alternative: Get users through joined query
-        users_with_tenant = supabase.service.table("user_tenants")\
-            .select("user_id, role, is_owner")\
-            .eq("tenant_id", tenant_id)\
-            .eq("is_active", True)\
-            .execute()
+        # Active tenant members; auth data is fetched in batch below
+        users_with_tenant = await _execute(
+            supabase.service.table("user_tenants")
+            .select("user_id, role, is_owner")
+            .eq("tenant_id", tenant_id)
+            .eq("is_active", True)
+        )
         
         if not users_with_tenant.data:
             return []
@@ -244,7 +564,7 @@ async def get_users_optimized_query(tenant_id: str) -> List[Dict[str, Any]]:
         user_ids = [ut["user_id"] for ut in users_with_tenant.data]
         user_tenant_map = {ut["user_id"]: ut for ut in users_with_tenant.data}
         
-        # Query 2: Batch get ALL related data in parallel
+        # Batch get ALL related data in parallel
         permissions_task = asyncio.create_task(get_permissions_batch(user_ids))
         cities_task = asyncio.create_task(get_cities_batch(user_ids))
         auth_users_task = asyncio.create_task(get_auth_users_batch(user_ids, user_tenant_map))
@@ -273,10 +593,11 @@ async def get_users_optimized_query(tenant_id: str) -> List[Dict[str, Any]]:
 
 async def get_permissions_batch(user_ids: List[str]) -> Dict[str, List[Dict]]:
     """Get all permissions in one query"""
-    result = supabase.service.table("user_permissions")\
-        .select("user_id, section, action")\
-        .in_("user_id", user_ids)\
-        .execute()
+    result = await _execute(
+        supabase.service.table("user_permissions")
+        .select("user_id, section, action")
+        .in_("user_id", user_ids)
+    )
     
     permissions_map = {}
     for perm in (result.data or []):
@@ -293,10 +614,11 @@ async def get_permissions_batch(user_ids: List[str]) -> Dict[str, List[Dict]]:
 
 async def get_cities_batch(user_ids: List[str]) -> Dict[str, List[str]]:
     """Get all cities in one query"""
-    result = supabase.service.table("users_city")\
-        .select("user_id, city_name")\
-        .in_("user_id", user_ids)\
-        .execute()
+    result = await _execute(
+        supabase.service.table("users_city")
+        .select("user_id, city_name")
+        .in_("user_id", user_ids)
+    )
     
     cities_map = {}
     for city in (result.data or []):
@@ -319,17 +641,16 @@ async def get_auth_users_batch(user_ids: List[str], user_tenant_map: Dict) -> Li
     # Note: This requires a database function or view to be created
     try:
         # Query auth users directly if we have access
-        result = supabase.service.rpc("get_auth_users_batch", {
+        result = await _execute(supabase.service.rpc("get_auth_users_batch", {
             "user_ids": user_ids
-        }).execute()
+        }))
         
         if result.data:
             for user in result.data:
                 tenant_info = user_tenant_map.get(user["id"], {})
                 is_admin = (
                     user.get("email") in ADMIN_EMAILS or
-                    tenant_info.get("role") == "admin" or
-                    tenant_info.get("role") == "owner" or
+                    tenant_info.get("role") in _ADMIN_ROLES or
                     tenant_info.get("is_owner", False)
                 )
                 
@@ -357,81 +678,140 @@ async def get_auth_users_batch(user_ids: List[str], user_tenant_map: Dict) -> Li
     except:
         pass
     
-    # Fallback: Use auth.admin API but with true parallel processing
-    # This is still slow but better than sequential
+    # Fallback: page through auth.admin.list_users instead of one GoTrue
+    # round-trip per user; only ids missing from the listing are fetched singly
+    def build_user_entry(user) -> Optional[Dict[str, Any]]:
+        if user.user_metadata and user.user_metadata.get("deleted"):
+            return None
+
+        tenant_info = user_tenant_map.get(user.id, {})
+        is_admin = (
+            user.email in ADMIN_EMAILS or
+            tenant_info.get("role") in _ADMIN_ROLES or
+            tenant_info.get("is_owner", False)
+        )
+
+        app_metadata = user.app_metadata or {}
+        if is_admin and app_metadata.get("role") != "admin":
+            app_metadata = dict(app_metadata)
+            app_metadata["role"] = "admin"
+
+        return {
+            "id": user.id,
+            "email": user.email,
+            "name": (user.user_metadata or {}).get("name", user.email.split('@')[0]),
+            "created_at": user.created_at.isoformat() if hasattr(user, 'created_at') and user.created_at else None,
+            "last_sign_in_at": user.last_sign_in_at.isoformat() if hasattr(user, 'last_sign_in_at') and user.last_sign_in_at else None,
+            "user_metadata": user.user_metadata or {},
+            "app_metadata": app_metadata,
+            "status": (user.user_metadata or {}).get("status", "active"),
+            "isAdmin": is_admin,
+            "role": tenant_info.get("role", "member"),
+            "tenant_role": tenant_info.get("role", "member"),
+            "is_owner": tenant_info.get("is_owner", False)
+        }
+
     async def fetch_single_user(uid: str):
         try:
-            response = supabase.auth.admin.get_user_by_id(uid)
+            response = await _run_blocking(supabase.auth.admin.get_user_by_id, uid)
             if response and response.user:
-                user = response.user
-                if user.user_metadata and user.user_metadata.get("deleted"):
-                    return None
-                
-                tenant_info = user_tenant_map.get(uid, {})
-                is_admin = (
-                    user.email in ADMIN_EMAILS or
-                    tenant_info.get("role") == "admin" or
-                    tenant_info.get("role") == "owner" or
-                    tenant_info.get("is_owner", False)
-                )
-
-                app_metadata = user.app_metadata or {}
-                if is_admin and app_metadata.get("role") != "admin":
-                    app_metadata = dict(app_metadata)
-                    app_metadata["role"] = "admin"
-
-                return {
-                    "id": user.id,
-                    "email": user.email,
-                    "name": (user.user_metadata or {}).get("name", user.email.split('@')[0]),
-                    "created_at": user.created_at.isoformat() if hasattr(user, 'created_at') and user.created_at else None,
-                    "last_sign_in_at": user.last_sign_in_at.isoformat() if hasattr(user, 'last_sign_in_at') and user.last_sign_in_at else None,
-                    "user_metadata": user.user_metadata or {},
-                    "app_metadata": app_metadata,
-                    "status": (user.user_metadata or {}).get("status", "active"),
-                    "isAdmin": is_admin,
-                    "role": tenant_info.get("role", "member"),
-                    "tenant_role": tenant_info.get("role", "member"),
-                    "is_owner": tenant_info.get("is_owner", False)
-                }
+                return build_user_entry(response.user)
         except:
             return None
-    
-    # Use asyncio to fetch all users in parallel
-    tasks = [fetch_single_user(uid) for uid in user_ids]
-    results = await asyncio.gather(*tasks)
-    
-    # Filter out None results
-    users_data = [u for u in results if u is not None]
-    
+
+    wanted = set(user_ids)
+    auth_users: Dict[str, Any] = {}
+    try:
+        page = 1
+        while True:
+            batch = await _run_blocking(
+                supabase.auth.admin.list_users, page=page, per_page=AUTH_USERS_PAGE_SIZE
+            )
+            for auth_user in batch or []:
+                if auth_user.id in wanted:
+                    auth_users[auth_user.id] = auth_user
+            if len(batch or []) < AUTH_USERS_PAGE_SIZE or len(auth_users) == len(wanted):
+                break
+            page += 1
+    except Exception as e:
+        logger.warning(f"Paged auth user listing failed, fetching users individually: {e}")
+
+    for uid in user_ids:
+        if uid in auth_users:
+            entry = build_user_entry(auth_users[uid])
+            if entry is not None:
+                users_data.append(entry)
+
+    # Users created after the listing was taken
+    missing = [uid for uid in user_ids if uid not in auth_users]
+    if missing:
+        results = await asyncio.gather(*(fetch_single_user(uid) for uid in missing))
+        users_data.extend(u for u in results if u is not None)
+
     return users_data
 
 
-@router.get("", response_model=UserListResponse)
-@router.get("/list", response_model=UserListResponse)
-@router.get("/list-tenant-users", response_model=UserListResponse)
+@router.get(
+    "",
+    response_model=None,
+    responses={200: {"model": UserListResponse}}
+)
+@router.get(
+    "/list",
+    response_model=None,
+    responses={200: {"model": UserListResponse}}
+)
+@router.get(
+    "/list-tenant-users",
+    response_model=None,
+    responses={200: {"model": UserListResponse}}
+)
 async def list_users_lightning(
-    background_tasks: BackgroundTasks,
     user: AuthenticatedUser = Depends(require_permission("users", "read")),
-    force_refresh: bool = Query(False, description="Force cache refresh")
+    force_refresh: bool = Query(False, description="Force cache refresh"),
+    offset: int = Query(0, ge=0, description="Users to skip (with limit)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit for the full list")
 ):
     """
     Lightning-fast user list endpoint.
     Uses Redis caching and single-query optimization.
+
+    Without ``limit`` the full list is returned. The first page is sliced
+    from the warm full-list cache; deeper pages are read from the database
+    page by page and cached individually.
     """
     start_time = time.time()
     
     try:
-        # Get tenant ID
-        tenant_query = supabase.service.table("user_tenants")\
-            .select("tenant_id")\
-            .eq("user_id", str(user.id))\
-            .eq("is_active", True)\
-            .limit(1)\
-            .execute()
-        
-        if not tenant_query.data:
-            return UserListResponse(
+        if limit is not None and offset > 0:
+            return await _list_users_deep_page(user, offset, limit, force_refresh, start_time)
+
+        user_cache_key = get_user_cache_key(str(user.id))
+
+        # Resolve the tenant and its generation while probing the user-scoped cache
+        if not force_refresh and redis_client.is_connected:
+            cached_data, (tenant_id, gen) = await asyncio.gather(
+                redis_client.get_offloaded(user_cache_key),
+                _resolve_tenant_generation(str(user.id)),
+            )
+            if (
+                cached_data
+                and cached_data.get("tenant_id") == tenant_id
+                and cached_data.get("gen") == gen
+            ):
+                logger.info(f"Redis cache HIT for user {user.id}")
+                return _user_list_response(
+                    users=cached_data["users"][:limit],
+                    total_count=cached_data["total_count"],
+                    cache_hit=True,
+                    response_time_ms=int((time.time() - start_time) * 1000),
+                    query_method="Redis cache (instant)"
+                )
+        else:
+            tenant_id, gen = await _resolve_tenant_generation(str(user.id))
+
+        if not tenant_id:
+            return _user_list_response(
                 users=[],
                 total_count=0,
                 cache_hit=False,
@@ -439,17 +819,17 @@ async def list_users_lightning(
                 query_method="No tenant found"
             )
         
-        tenant_id = tenant_query.data[0]["tenant_id"]
-        cache_key = get_cache_key(tenant_id)
+        cache_key = get_cache_key(tenant_id, gen)
         
-        # Check Redis cache first (fastest)
+        # Fall back to the tenant-wide cache
         if not force_refresh and redis_client.is_connected:
             try:
-                cached_data = await redis_client.get(cache_key)
+                cached_data = await redis_client.get_offloaded(cache_key)
                 if cached_data:
                     logger.info(f"Redis cache HIT for tenant {tenant_id}")
-                    return UserListResponse(
-                        users=cached_data["users"],
+                    await redis_client.set(user_cache_key, cached_data, ttl=300)
+                    return _user_list_response(
+                        users=cached_data["users"][:limit],
                         total_count=cached_data["total_count"],
                         cache_hit=True,
                         response_time_ms=int((time.time() - start_time) * 1000),
@@ -459,35 +839,59 @@ async def list_users_lightning(
                 logger.warning(f"Redis cache error: {e}")
         
         logger.info(f"Cache MISS for tenant {tenant_id}, fetching from database")
-        
-        # Fetch users using optimized single query
-        users_data = await get_users_single_query(tenant_id)
-        
-        # Sort by creation date (newest first)
-        users_data.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        # Cache in Redis for 5 minutes
-        cache_data = {
-            "users": users_data,
-            "total_count": len(users_data),
-            "cached_at": datetime.now().isoformat()
-        }
-        
+
+        # Only one request per tenant rebuilds the cache; the rest wait briefly
+        # for it and otherwise serve the last known list
+        lock_key = get_refresh_lock_key(tenant_id)
+        holds_lock = False
         if redis_client.is_connected:
-            try:
-                await redis_client.set(cache_key, cache_data, ttl=300)  # 5 minutes
-                logger.info(f"Cached {len(users_data)} users in Redis")
-            except Exception as e:
-                logger.warning(f"Failed to cache in Redis: {e}")
-        
-        # Schedule background cache refresh
-        background_tasks.add_task(refresh_cache, tenant_id)
+            holds_lock = await redis_client.acquire_lock(lock_key, ttl=REFRESH_LOCK_TTL)
+            if not holds_lock and not force_refresh:
+                cached_data = None
+                for _ in range(REFRESH_WAIT_POLLS):
+                    await asyncio.sleep(REFRESH_WAIT_INTERVAL)
+                    cached_data = await redis_client.get_offloaded(cache_key)
+                    if cached_data:
+                        break
+                query_method = "Redis cache (instant)"
+                if not cached_data:
+                    cached_data = await redis_client.get_offloaded(get_stale_cache_key(tenant_id))
+                    query_method = "stale"
+                if cached_data:
+                    return _user_list_response(
+                        users=cached_data["users"][:limit],
+                        total_count=cached_data["total_count"],
+                        cache_hit=True,
+                        response_time_ms=int((time.time() - start_time) * 1000),
+                        query_method=query_method
+                    )
+
+        try:
+            # Fetch users using optimized single query
+            users_data = await get_users_single_query(tenant_id)
+            
+            # Cache in Redis for 5 minutes
+            cache_data = {
+                "users": users_data,
+                "total_count": len(users_data),
+                "cached_at": datetime.now().isoformat()
+            }
+            
+            if redis_client.is_connected:
+                try:
+                    await cache_user_list(tenant_id, gen, cache_data, ttl=300, user_id=str(user.id))  # 5 minutes
+                    logger.info(f"Cached {len(users_data)} users in Redis")
+                except Exception as e:
+                    logger.warning(f"Failed to cache in Redis: {e}")
+        finally:
+            if holds_lock:
+                await redis_client.delete(lock_key)
         
         response_time = int((time.time() - start_time) * 1000)
         logger.info(f"Returned {len(users_data)} users in {response_time}ms")
         
-        return UserListResponse(
-            users=users_data,
+        return _user_list_response(
+            users=users_data[:limit],
             total_count=len(users_data),
             cache_hit=False,
             response_time_ms=response_time,
@@ -502,22 +906,72 @@ async def list_users_lightning(
         )
 
 
-async def refresh_cache(tenant_id: str):
-    """Background task to refresh cache"""
-    try:
-        users_data = await get_users_single_query(tenant_id)
-        cache_key = get_cache_key(tenant_id)
-        cache_data = {
-            "users": users_data,
-            "total_count": len(users_data),
-            "cached_at": datetime.now().isoformat()
-        }
-        
-        if redis_client.is_connected:
-            await redis_client.set(cache_key, cache_data, ttl=600)  # 10 minutes
-            logger.info(f"Background cache refresh completed for tenant {tenant_id}")
-    except Exception as e:
-        logger.error(f"Error refreshing cache: {e}")
+async def _resolve_tenant_generation(user_id: str) -> Tuple[Optional[str], int]:
+    """Resolve the user's tenant and the current generation of its user list."""
+    tenant_id = await get_user_tenant_id(user_id)
+    if not tenant_id:
+        return None, 0
+    return tenant_id, await get_tenant_generation(tenant_id)
+
+
+async def _list_users_deep_page(
+    user: AuthenticatedUser,
+    offset: int,
+    limit: int,
+    force_refresh: bool,
+    start_time: float,
+) -> ORJSONResponse:
+    """Serve a page past the first straight from the database, cached per page."""
+    tenant_id, gen = await _resolve_tenant_generation(str(user.id))
+    if not tenant_id:
+        return _user_list_response(
+            users=[],
+            total_count=0,
+            cache_hit=False,
+            response_time_ms=int((time.time() - start_time) * 1000),
+            query_method="No tenant found"
+        )
+
+    page_key = get_page_cache_key(tenant_id, gen, offset, limit)
+    if not force_refresh and redis_client.is_connected:
+        cached_page = await redis_client.get(page_key)
+        if cached_page:
+            return _user_list_response(
+                users=cached_page["users"],
+                total_count=cached_page["total_count"],
+                cache_hit=True,
+                response_time_ms=int((time.time() - start_time) * 1000),
+                query_method="Redis cache (page)"
+            )
+
+    users_data, total_count = await get_users_page(tenant_id, offset, limit)
+    if redis_client.is_connected:
+        await redis_client.set(page_key, {"users": users_data, "total_count": total_count}, ttl=300)
+
+    return _user_list_response(
+        users=users_data,
+        total_count=total_count,
+        cache_hit=False,
+        response_time_ms=int((time.time() - start_time) * 1000),
+        query_method="Paged database query"
+    )
+
+
+def _user_list_response(
+    users: List[Dict[str, Any]],
+    total_count: int,
+    cache_hit: bool,
+    response_time_ms: int,
+    query_method: str,
+) -> ORJSONResponse:
+    """Serialize the user list straight to orjson, skipping model validation."""
+    return ORJSONResponse({
+        "users": users,
+        "total_count": total_count,
+        "cache_hit": cache_hit,
+        "response_time_ms": response_time_ms,
+        "query_method": query_method,
+    })
 
 
 @router.post("/setup-database-optimization")
@@ -540,7 +994,13 @@ async def setup_database_optimization(
     functions.append({
         "name": "get_all_tenant_users_lightning",
         "sql": """
-CREATE OR REPLACE FUNCTION get_all_tenant_users_lightning(p_tenant_id UUID)
+DROP FUNCTION IF EXISTS get_all_tenant_users_lightning(UUID);
+
+CREATE OR REPLACE FUNCTION get_all_tenant_users_lightning(
+    p_tenant_id UUID,
+    p_offset INTEGER DEFAULT 0,
+    p_limit INTEGER DEFAULT NULL
+)
 RETURNS TABLE (
     id UUID,
     email TEXT,
@@ -554,7 +1014,8 @@ RETURNS TABLE (
     status TEXT,
     isAdmin BOOLEAN,
     role TEXT,
-    is_owner BOOLEAN
+    is_owner BOOLEAN,
+    total_count BIGINT
 )
 LANGUAGE sql
 SECURITY DEFINER
@@ -602,7 +1063,8 @@ AS $$
          OR ut.role IN ('admin', 'owner') 
          OR ut.is_owner = true) as isAdmin,
         COALESCE(ut.role, 'member') as role,
-        COALESCE(ut.is_owner, false) as is_owner
+        COALESCE(ut.is_owner, false) as is_owner,
+        count(*) OVER () as total_count
     FROM auth.users au
     INNER JOIN user_tenants ut ON ut.user_id = au.id::text
     LEFT JOIN user_perms up ON up.user_id = au.id::text
@@ -611,7 +1073,9 @@ AS $$
     AND ut.is_active = true
     AND au.deleted_at IS NULL
     AND COALESCE((au.raw_user_meta_data->>'deleted')::BOOLEAN, false) = false
-    ORDER BY au.created_at DESC;
+    ORDER BY au.created_at DESC
+    OFFSET p_offset
+    LIMIT p_limit;
 $$;
 """
     })
@@ -652,6 +1116,107 @@ $$;
 """
     })
     
+    # Function 3: Create tenant membership, permissions and cities in one transaction
+    functions.append({
+        "name": "rpc_create_user_full",
+        "sql": """
+CREATE OR REPLACE FUNCTION rpc_create_user_full(
+    p_tenant_id UUID,
+    p_user_id TEXT,
+    p_role TEXT,
+    p_permissions JSONB,
+    p_cities TEXT[]
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO user_tenants (tenant_id, user_id, role, is_active)
+    VALUES (p_tenant_id, p_user_id, p_role, true)
+    ON CONFLICT (tenant_id, user_id)
+    DO UPDATE SET role = EXCLUDED.role, is_active = true;
+
+    INSERT INTO user_permissions (user_id, section, action)
+    SELECT p_user_id, perm->>'section', perm->>'action'
+    FROM jsonb_array_elements(COALESCE(p_permissions, '[]'::jsonb)) AS perm;
+
+    INSERT INTO users_city (user_id, city_name)
+    SELECT p_user_id, city
+    FROM unnest(COALESCE(p_cities, ARRAY[]::TEXT[])) AS city;
+END;
+$$;
+"""
+    })
+    
+    # Function 4: Sync a user's permissions, cities and departments in one transaction
+    functions.append({
+        "name": "sync_user_children",
+        "sql": """
+CREATE OR REPLACE FUNCTION sync_user_children(
+    p_user_id TEXT,
+    p_permissions JSONB,
+    p_cities JSONB,
+    p_departments JSONB
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    -- NULL leaves a table untouched; otherwise only the difference is written
+    IF p_permissions IS NOT NULL THEN
+        DELETE FROM user_permissions up
+        WHERE up.user_id = p_user_id
+        AND NOT EXISTS (
+            SELECT 1 FROM jsonb_populate_recordset(NULL::user_permissions, p_permissions) d
+            WHERE d.section = up.section AND d.action = up.action
+        );
+        INSERT INTO user_permissions (user_id, section, action)
+        SELECT DISTINCT p_user_id, d.section, d.action
+        FROM jsonb_populate_recordset(NULL::user_permissions, p_permissions) d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_permissions up
+            WHERE up.user_id = p_user_id AND up.section = d.section AND up.action = d.action
+        );
+    END IF;
+
+    IF p_cities IS NOT NULL THEN
+        DELETE FROM users_city uc
+        WHERE uc.user_id = p_user_id
+        AND NOT EXISTS (
+            SELECT 1 FROM jsonb_populate_recordset(NULL::users_city, p_cities) d
+            WHERE d.city_name = uc.city_name
+        );
+        INSERT INTO users_city (user_id, city_name)
+        SELECT DISTINCT p_user_id, d.city_name
+        FROM jsonb_populate_recordset(NULL::users_city, p_cities) d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM users_city uc
+            WHERE uc.user_id = p_user_id AND uc.city_name = d.city_name
+        );
+    END IF;
+
+    IF p_departments IS NOT NULL THEN
+        DELETE FROM user_departments ud
+        WHERE ud.user_id = p_user_id
+        AND NOT EXISTS (
+            SELECT 1 FROM jsonb_populate_recordset(NULL::user_departments, p_departments) d
+            WHERE d.department_id = ud.department_id
+        );
+        INSERT INTO user_departments (user_id, department_id)
+        SELECT DISTINCT p_user_id, d.department_id
+        FROM jsonb_populate_recordset(NULL::user_departments, p_departments) d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_departments ud
+            WHERE ud.user_id = p_user_id AND ud.department_id = d.department_id
+        );
+    END IF;
+END;
+$$;
+"""
+    })
+    
     # Create indexes for performance
     indexes = [
         "CREATE INDEX IF NOT EXISTS idx_user_tenants_tenant_id_active ON user_tenants(tenant_id, is_active) WHERE is_active = true;",
@@ -676,20 +1241,13 @@ async def clear_cache(
     """Clear user cache for current tenant"""
     try:
         # Get tenant ID
-        tenant_query = supabase.service.table("user_tenants")\
-            .select("tenant_id")\
-            .eq("user_id", str(user.id))\
-            .eq("is_active", True)\
-            .limit(1)\
-            .execute()
-        
-        if tenant_query.data:
-            tenant_id = tenant_query.data[0]["tenant_id"]
-            cache_key = get_cache_key(tenant_id)
-            
-            if redis_client.is_connected:
-                await redis_client.delete(cache_key)
-                logger.info(f"Cleared Redis cache for tenant {tenant_id}")
+        tenant_id = await get_user_tenant_id(str(user.id))
+
+        if tenant_id:
+            await asyncio.gather(
+                bump_tenant_generation(tenant_id),
+                publish_tenant_cities_invalidation(tenant_id),
+            )
             
             return {"success": True, "message": f"Cache cleared for tenant {tenant_id}"}
         
@@ -732,17 +1290,24 @@ async def list_users_brief(
     """Brief list of users for dropdowns"""
     # Use lightning-fast query if possible
     try:
-        tenant_query = supabase.service.table("user_tenants")\
-            .select("tenant_id")\
-            .eq("user_id", str(user.id))\
-            .eq("is_active", True)\
-            .limit(1)\
-            .execute()
-        
-        if tenant_query.data:
-            tenant_id = tenant_query.data[0]["tenant_id"]
-            cache_key = get_cache_key(tenant_id)
+        tenant_id = await get_user_tenant_id(str(user.id))
+
+        if tenant_id:
+            gen = await get_tenant_generation(tenant_id)
+            cache_key = get_cache_key(tenant_id, gen)
             
+            # Brief side-indexes: only the requested or newest entries are decoded
+            if redis_client.is_connected:
+                if ids:
+                    entries = await redis_client.hmget(
+                        get_brief_cache_key(tenant_id, gen), ids.split(',')[:BRIEF_LIST_LIMIT]
+                    )
+                    brief_users = [entry for entry in entries if entry]
+                else:
+                    brief_users = await redis_client.get(get_brief_top_cache_key(tenant_id, gen))
+                if brief_users:
+                    return {"users": brief_users}
+
             # Check cache first
             if redis_client.is_connected:
                 cached_data = await redis_client.get(cache_key)
@@ -756,25 +1321,26 @@ async def list_users_brief(
                         "id": u["id"],
                         "email": u["email"],
                         "name": u.get("name") or u["email"].split('@')[0]
-                    } for u in users[:50]]
+                    } for u in users[:BRIEF_LIST_LIMIT]]
                     
                     return {"users": brief_users}
         
-        # Fallback to direct query
+        # Fallback to direct query, overlapping the GoTrue round-trips
         if ids:
-            id_list = ids.split(',')
+            id_list = ids.split(',')[:50]
+            responses = await asyncio.gather(
+                *(_run_blocking(supabase.auth.admin.get_user_by_id, uid) for uid in id_list),
+                return_exceptions=True,
+            )
             brief_users = []
-            for uid in id_list[:50]:
-                try:
-                    response = supabase.auth.admin.get_user_by_id(uid)
-                    if response and response.user:
-                        brief_users.append({
-                            "id": response.user.id,
-                            "email": response.user.email,
-                            "name": (response.user.user_metadata or {}).get("name", response.user.email.split('@')[0])
-                        })
-                except:
+            for response in responses:
+                if isinstance(response, BaseException) or not response or not response.user:
                     continue
+                brief_users.append({
+                    "id": response.user.id,
+                    "email": response.user.email,
+                    "name": (response.user.user_metadata or {}).get("name", response.user.email.split('@')[0])
+                })
             return {"users": brief_users}
         
         return {"users": []}
@@ -806,68 +1372,86 @@ async def create_user(
             "app_metadata": {"role": "admin" if is_admin else "user"}
         }
 
-        response = supabase.auth.admin.create_user(user_data)
+        # Create the auth user and look up the operator's tenant concurrently
+        response, tenant_query = await asyncio.gather(
+            _run_blocking(supabase.auth.admin.create_user, user_data),
+            _execute(
+                supabase.service.table("user_tenants")
+                .select("tenant_id")
+                .eq("user_id", str(user.id))
+                .limit(1)
+            ),
+        )
 
         if not response or not response.user:
             raise HTTPException(status_code=400, detail="Failed to create user")
 
         new_user_id = response.user.id
 
-        # Get tenant context
-        tenant_query = supabase.service.table("user_tenants")\
-            .select("tenant_id")\
-            .eq("user_id", str(user.id))\
-            .limit(1)\
-            .execute()
+        tenant_id = tenant_query.data[0]["tenant_id"] if tenant_query.data else None
+        tenant_role = "admin" if is_admin else "member"
 
-        tenant_id = None
-        if tenant_query.data:
-            tenant_id = tenant_query.data[0]["tenant_id"]
-
-            # Add user to tenant
-            supabase.service.table("user_tenants").upsert({
-                "tenant_id": tenant_id,
-                "user_id": new_user_id,
-                "role": "admin" if is_admin else "member",
-                "is_active": True,
-            }, on_conflict="tenant_id,user_id").execute()
-
-        # Insert permissions if provided
-        if create_request.permissions:
-            permissions_data = [
-                {
-                    "user_id": new_user_id,
-                    "section": perm["section"],
-                    "action": perm["action"]
-                }
-                for perm in create_request.permissions
-            ]
-            supabase.service.table("user_permissions")\
-                .insert(permissions_data)\
-                .execute()
-            logger.info(f"Inserted {len(permissions_data)} permissions for new user {new_user_id}")
+        # Built once without user_id: the RPC takes these as-is and only the
+        # direct-insert fallback needs the user_id column added
+        permissions_data = [
+            {"section": perm["section"], "action": perm["action"]}
+            for perm in create_request.permissions
+        ]
 
-        # Insert cities if provided (only for non-admin users)
+        # Cities only apply to non-admin users
+        filtered_cities: List[str] = []
         if create_request.cities and not is_admin:
             # Get allowed cities for tenant to validate
-            allowed_cities = get_allowed_cities_for_tenants([tenant_id] if tenant_id else [])
-            allowed_city_map = {city.lower(): city for city in allowed_cities}
+            allowed_cities = await get_allowed_cities_cached([tenant_id] if tenant_id else [])
+            allowed_city_map = get_city_lookup(allowed_cities)
 
             # Filter cities to only those allowed by tenant
-            if allowed_city_map:
-                filtered_cities = []
-                for city in create_request.cities:
-                    if isinstance(city, str):
-                        key = city.strip().lower()
-                        if key in allowed_city_map:
-                            filtered_cities.append(allowed_city_map[key])
-            else:
-                filtered_cities = [
-                    city.strip()
-                    for city in create_request.cities
-                    if isinstance(city, str) and city.strip()
-                ]
+            filtered_cities = filter_allowed_cities(create_request.cities, allowed_city_map)
+        elif is_admin:
+            logger.info(f"User {new_user_id} is admin; skipped inserting city assignments")
 
+        # Tenant membership, permissions and cities in one transaction server-side
+        written_by_rpc = False
+        if tenant_id:
+            try:
+                await _execute(supabase.service.rpc("rpc_create_user_full", {
+                    "p_tenant_id": tenant_id,
+                    "p_user_id": new_user_id,
+                    "p_role": tenant_role,
+                    "p_permissions": permissions_data,
+                    "p_cities": filtered_cities,
+                }))
+                written_by_rpc = True
+                logger.info(
+                    f"Created tenant membership, {len(permissions_data)} permissions and "
+                    f"{len(filtered_cities)} city assignments for new user {new_user_id}"
+                )
+            except Exception as rpc_error:
+                logger.warning(f"rpc_create_user_full not available, writing tables directly: {rpc_error}")
+
+        if not written_by_rpc:
+            # The three tables are independent, so write them concurrently
+            writes = []
+            if tenant_id:
+                # Add user to tenant
+                writes.append(_execute(
+                    supabase.service.table("user_tenants").upsert({
+                        "tenant_id": tenant_id,
+                        "user_id": new_user_id,
+                        "role": tenant_role,
+                        "is_active": True,
+                    }, on_conflict="tenant_id,user_id")
+                ))
+
+            # Insert permissions if provided
+            if permissions_data:
+                writes.append(_execute(
+                    supabase.service.table("user_permissions").insert(
+                        [{"user_id": new_user_id, **perm} for perm in permissions_data]
+                    )
+                ))
+
+            # Insert cities if provided
             if filtered_cities:
                 cities_data = [
                     {
@@ -876,18 +1460,19 @@ async def create_user(
                     }
                     for city in filtered_cities
                 ]
-                supabase.service.table("users_city")\
-                    .insert(cities_data)\
-                    .execute()
-                logger.info(f"Inserted {len(cities_data)} city assignments for new user {new_user_id}")
-        elif is_admin:
-            logger.info(f"User {new_user_id} is admin; skipped inserting city assignments")
+                writes.append(_execute(
+                    supabase.service.table("users_city").insert(cities_data)
+                ))
+
+            await asyncio.gather(*writes)
+            logger.info(
+                f"Inserted {len(permissions_data)} permissions and "
+                f"{len(filtered_cities)} city assignments for new user {new_user_id}"
+            )
 
         # Clear cache
-        if tenant_id and redis_client.is_connected:
-            cache_key = get_cache_key(tenant_id)
-            await redis_client.delete(cache_key)
-            logger.info(f"Cleared cache for tenant {tenant_id}")
+        if tenant_id:
+            await bump_tenant_generation(tenant_id)
 
         return {"userId": new_user_id, "message": "User created successfully"}
 
@@ -898,6 +1483,58 @@ async def create_user(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _postgrest_quote(value: Any) -> str:
+    """Quote a value for use inside a PostgREST or=/and= filter"""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+async def sync_child_table(
+    table: str,
+    user_id: str,
+    key_cols: Tuple[str, ...],
+    desired_rows: List[Dict[str, Any]],
+) -> None:
+    """
+    Make a user's rows in a child table match ``desired_rows``.
+
+    Only the difference is written: one DELETE for removed keys and one
+    batched INSERT for added keys, and nothing at all when the set is unchanged.
+    """
+    existing_resp = await _execute(
+        supabase.service.table(table)
+        .select(", ".join(key_cols))
+        .eq("user_id", user_id)
+    )
+    existing = {tuple(row.get(col) for col in key_cols) for row in existing_resp.data or []}
+    desired = {tuple(row[col] for col in key_cols) for row in desired_rows}
+
+    to_delete = existing - desired
+    if to_delete:
+        query = supabase.service.table(table).delete().eq("user_id", user_id)
+        if len(key_cols) == 1:
+            query = query.in_(key_cols[0], [key[0] for key in to_delete])
+        else:
+            query = query.or_(",".join(
+                "and(" + ",".join(
+                    f"{col}.eq.{_postgrest_quote(value)}" for col, value in zip(key_cols, key)
+                ) + ")"
+                for key in to_delete
+            ))
+        await _execute(query)
+
+    # Keep the caller's order for inserts, dropping duplicates
+    to_add: List[Dict[str, Any]] = []
+    seen = set(existing)
+    for row in desired_rows:
+        key = tuple(row[col] for col in key_cols)
+        if key not in seen:
+            seen.add(key)
+            to_add.append({"user_id": user_id, **dict(zip(key_cols, key))})
+    if to_add:
+        await _execute(supabase.service.table(table).insert(to_add))
+
+
 @router.get("/{user_id}")
 async def get_user(
     user_id: str,
@@ -905,72 +1542,90 @@ async def get_user(
 ):
     """Get user details including role and metadata"""
     try:
-        # Get user from auth
-        response = supabase.auth.admin.get_user_by_id(user_id)
+        # Allowed cities depend on the viewing operator's tenant, so responses
+        # are cached per tenant and also dropped when its generation moves on
+        current_operator_tid = getattr(user, 'tenant_id', None)
+        detail_key = get_user_detail_cache_key(user_id)
+        detail_field = current_operator_tid or "-"
+        gen = 0
+        if redis_client.is_connected:
+            cached, gen = await asyncio.gather(
+                redis_client.hget(detail_key, detail_field),
+                get_tenant_generation(current_operator_tid),
+            )
+            if cached and cached.get("gen") == gen:
+                return cached["user"]
+
+        async def fetch_tenant_rows() -> List[Dict[str, Any]]:
+            try:
+                result = await _execute(
+                    supabase.service.table("user_tenants")
+                    .select("tenant_id, role")
+                    .eq("user_id", user_id)
+                    .eq("is_active", True)
+                )
+                return result.data or []
+            except Exception as tenant_role_error:
+                logger.warning(
+                    f"Failed to fetch tenant role for user {user_id}: {tenant_role_error}"
+                )
+                return []
+
+        async def fetch_city_rows() -> List[Dict[str, Any]]:
+            try:
+                result = await _execute(
+                    supabase.service.table("users_city")
+                    .select("city_name")
+                    .eq("user_id", user_id)
+                )
+                return result.data or []
+            except Exception as city_error:
+                logger.warning(f"Failed to fetch user cities for {user_id}: {city_error}")
+                return []
+
+        # The auth user, tenant rows and city rows are independent lookups
+        response, tenant_rows, city_rows = await asyncio.gather(
+            _run_blocking(supabase.auth.admin.get_user_by_id, user_id),
+            fetch_tenant_rows(),
+            fetch_city_rows(),
+        )
         if not response or not response.user:
             raise HTTPException(status_code=404, detail="User not found")
-        
+
         auth_user = response.user
-        
-        # Determine tenant-based role as fallback
-        tenant_role = None
-        tenant_ids: List[str] = []
-        try:
-            tenant_rows_query = supabase.service.table("user_tenants")\
-                .select("tenant_id, role")\
-                .eq("user_id", user_id)\
-                .eq("is_active", True)\
-                .execute()
-
-            if tenant_rows_query.data:
-                tenant_ids = [row.get("tenant_id") for row in tenant_rows_query.data if row.get("tenant_id")]
-                # Prefer admin/owner role if present
-                tenant_role = None
-                for row in tenant_rows_query.data:
-                    role = row.get("role")
-                    if role:
-                        tenant_role = role
-                    if role in ("admin", "owner"):
-                        tenant_role = role
-                        break
-        except Exception as tenant_role_error:
-            logger.warning(
-                f"Failed to fetch tenant role for user {user_id}: {tenant_role_error}"
-            )
+
+        # Determine tenant-based role as fallback, preferring admin/owner if present
+        tenant_ids: List[str] = [row["tenant_id"] for row in tenant_rows if row.get("tenant_id")]
+        tenant_role = next(
+            (row["role"] for row in tenant_rows if row.get("role") in _ADMIN_ROLES), None
+        ) or next((row["role"] for row in tenant_rows if row.get("role")), None)
 
         existing_app_metadata = auth_user.app_metadata or {}
         is_admin_from_metadata = existing_app_metadata.get("role") == "admin"
-        is_admin_from_tenant = tenant_role in ("admin", "owner")
+        is_admin_from_tenant = tenant_role in _ADMIN_ROLES
 
-        app_metadata = dict(existing_app_metadata)
-        if is_admin_from_tenant and app_metadata.get("role") != "admin":
-            app_metadata["role"] = "admin"
+        # Only copy the metadata when the role actually has to be overridden
+        if is_admin_from_tenant and not is_admin_from_metadata:
+            app_metadata = {**existing_app_metadata, "role": "admin"}
+        else:
+            app_metadata = existing_app_metadata
 
         # Change: Prefer current operator's tenant for allowed cities scope
-        current_operator_tid = getattr(user, 'tenant_id', None)
         preferred_tenant_ids = [current_operator_tid] if current_operator_tid else tenant_ids
-        allowed_cities = get_allowed_cities_for_tenants(preferred_tenant_ids)
-        allowed_map = {city.lower(): city for city in allowed_cities}
+        allowed_cities = await get_allowed_cities_cached(preferred_tenant_ids)
+        allowed_map = get_city_lookup(allowed_cities)
 
         raw_city_rows: List[str] = []
-        try:
-            cities_response = supabase.service.table("users_city")\
-                .select("city_name")\
-                .eq("user_id", user_id)\
-                .execute()
-            for row in cities_response.data or []:
-                city = (row.get("city_name") or "").strip()
-                if city:
-                    raw_city_rows.append(city)
-        except Exception as city_error:
-            logger.warning(f"Failed to fetch user cities for {user_id}: {city_error}")
+        for row in city_rows:
+            city = (row.get("city_name") or "").strip()
+            if city:
+                raw_city_rows.append(city)
 
         if allowed_map:
-            user_cities = []
-            for city in raw_city_rows:
-                key = city.lower()
-                if key in allowed_map:
-                    user_cities.append(allowed_map[key])
+            user_cities = [
+                allowed_map[key] for city in raw_city_rows
+                if (key := city.casefold()) in allowed_map
+            ]
         else:
             user_cities = raw_city_rows
 
@@ -993,6 +1648,11 @@ async def get_user(
             "status": auth_user.user_metadata.get("status", "active") if auth_user.user_metadata else "active"
         }
 
+        if redis_client.is_connected:
+            await redis_client.hset(
+                detail_key, detail_field, {"gen": gen, "user": user_data}, ttl=USER_DETAIL_CACHE_TTL
+            )
+
         return user_data
         
     except HTTPException:
@@ -1002,6 +1662,31 @@ async def get_user(
         raise HTTPException(status_code=500, detail="Failed to fetch user")
 
 
+# app_metadata keys that live in their own tables and must not reach Auth
+_APP_METADATA_TABLE_KEYS = frozenset({"permissions", "cities"})
+
+
+def _clean_metadata(metadata: Dict[str, Any], drop_keys: frozenset = frozenset()) -> Dict[str, Any]:
+    """Drop empty ("" / None) values and any ``drop_keys`` from a metadata dict."""
+    return {k: v for k, v in metadata.items() if k not in drop_keys and v not in ("", None)}
+
+
+async def _try_update_auth(
+    user_id: str, attributes: Dict[str, Any]
+) -> Tuple[Optional[Any], Optional[Exception]]:
+    """Update the auth user, returning ``(response, error)`` instead of raising."""
+    try:
+        return await _run_blocking(supabase.auth.admin.update_user_by_id, user_id, attributes), None
+    except Exception as e:
+        return None, e
+
+
+def _is_transient_auth_error(error: Exception) -> bool:
+    """Whether GoTrue failed with an internal error worth a reduced retry."""
+    error_msg = str(error)
+    return "500" in error_msg or "Internal Server Error" in error_msg
+
+
 @router.put("/{user_id}")
 async def update_user(
     user_id: str,
@@ -1016,11 +1701,12 @@ async def update_user(
 
         tenant_rows: List[Dict[str, Any]] = []
         try:
-            tenant_rows_resp = supabase.service.table("user_tenants")\
-                .select("tenant_id, role")\
-                .eq("user_id", user_id)\
-                .eq("is_active", True)\
-                .execute()
+            tenant_rows_resp = await _execute(
+                supabase.service.table("user_tenants")
+                .select("tenant_id, role")
+                .eq("user_id", user_id)
+                .eq("is_active", True)
+            )
             tenant_rows = tenant_rows_resp.data or []
         except Exception as tenant_fetch_error:
             logger.warning(f"Unable to fetch tenant rows for {user_id}: {tenant_fetch_error}")
@@ -1034,8 +1720,8 @@ async def update_user(
             if not tenant_ids and getattr(user, "tenant_id", None):
                 tenant_ids = [user.tenant_id]
 
-        allowed_cities_list = get_allowed_cities_for_tenants(tenant_ids or [])
-        allowed_city_map = {city.lower(): city for city in allowed_cities_list}
+        allowed_cities_list = await get_allowed_cities_cached(tenant_ids or [])
+        allowed_city_map = get_city_lookup(allowed_cities_list)
 
         # Update user metadata if provided
         attributes = {}
@@ -1047,15 +1733,15 @@ async def update_user(
             attributes["password"] = update_request.password
         if update_request.user_metadata:
             # Filter out empty string values which might cause issues
-            filtered_user_metadata = {k: v for k, v in update_request.user_metadata.items() 
-                                     if v != "" and v is not None}
+            filtered_user_metadata = _clean_metadata(update_request.user_metadata)
             if filtered_user_metadata:
                 attributes["user_metadata"] = filtered_user_metadata
         if update_request.app_metadata:
             # IMPORTANT: Don't include permissions or cities in app_metadata
             # They should only be stored in their respective tables
-            filtered_app_metadata = {k: v for k, v in update_request.app_metadata.items() 
-                                    if k not in ['permissions', 'cities'] and v != "" and v is not None}
+            filtered_app_metadata = _clean_metadata(
+                update_request.app_metadata, drop_keys=_APP_METADATA_TABLE_KEYS
+            )
             if filtered_app_metadata:
                 attributes["app_metadata"] = filtered_app_metadata
         
@@ -1065,30 +1751,24 @@ async def update_user(
         # Update auth user if there are attributes to update
         if attributes:
             try:
-                # Log what we're sending
-                logger.info(f"Updating auth user {user_id} with attributes: {json.dumps(attributes, default=str)}")
+                # Log which fields we're sending, not their values
+                logger.info(f"Updating auth user {user_id} with attributes: {sorted(attributes)}")
                 
                 # Try to update the user
-                try:
-                    auth_update_response = supabase.auth.admin.update_user_by_id(user_id, attributes)
-                except Exception as supabase_error:
-                    # Check if it's a Supabase internal error
-                    error_msg = str(supabase_error)
-                    logger.error(f"Supabase auth update failed for {user_id}: {error_msg}")
-                    
-                    # If it's a 500 error from Supabase, try a simpler update
-                    if "500" in error_msg or "Internal Server Error" in error_msg:
+                auth_update_response, supabase_error = await _try_update_auth(user_id, attributes)
+                if supabase_error is not None:
+                    logger.error(f"Supabase auth update failed for {user_id}: {supabase_error}")
+
+                    # If it's a 500 error from Supabase, try updating just the role
+                    # without other metadata
+                    role_only = (attributes.get("app_metadata") or {}).get("role")
+                    if role_only is not None and _is_transient_auth_error(supabase_error):
                         logger.info("Attempting simplified update without metadata...")
-                        # Try updating just the role without other metadata
-                        if 'app_metadata' in attributes and 'role' in attributes['app_metadata']:
-                            simple_attributes = {
-                                "app_metadata": {"role": attributes['app_metadata']['role']}
-                            }
-                            auth_update_response = supabase.auth.admin.update_user_by_id(user_id, simple_attributes)
-                        else:
-                            raise
-                    else:
-                        raise
+                        auth_update_response, supabase_error = await _try_update_auth(
+                            user_id, {"app_metadata": {"role": role_only}}
+                        )
+                    if supabase_error is not None:
+                        raise supabase_error
                 
                 # Verify the update was successful
                 if auth_update_response and auth_update_response.user:
@@ -1096,7 +1776,7 @@ async def update_user(
                     if not raw_app_metadata and hasattr(auth_update_response.user, 'raw_app_metadata'):
                         raw_app_metadata = getattr(auth_update_response.user, 'raw_app_metadata', None)
                     updated_app_metadata = raw_app_metadata or {}
-                    logger.info(f"Updated user app_metadata: {json.dumps(updated_app_metadata, default=str)}")
+                    logger.info(f"Updated user app_metadata keys: {sorted(updated_app_metadata)}")
                     is_admin_role = updated_app_metadata.get('role') == 'admin'
                     
                     # Verify role was actually updated if we tried to update it
@@ -1128,11 +1808,12 @@ async def update_user(
 
                     # Try direct auth.users table update as last-resort fallback
                     try:
-                        meta_response = supabase.service.table("auth.users")\
-                            .select("raw_app_meta_data, app_metadata")\
-                            .eq("id", user_id)\
-                            .limit(1)\
-                            .execute()
+                        meta_response = await _execute(
+                            supabase.service.table("auth.users")
+                            .select("raw_app_meta_data, app_metadata")
+                            .eq("id", user_id)
+                            .limit(1)
+                        )
 
                         existing_meta = {}
                         if meta_response.data:
@@ -1142,13 +1823,14 @@ async def update_user(
                         new_meta = dict(existing_meta)
                         new_meta["role"] = requested_role
 
-                        supabase.service.table("auth.users")\
+                        await _execute(
+                            supabase.service.table("auth.users")
                             .update({
                                 "raw_app_meta_data": new_meta,
                                 "app_metadata": new_meta
-                            })\
-                            .eq("id", user_id)\
-                            .execute()
+                            })
+                            .eq("id", user_id)
+                        )
 
                         logger.info(
                             f"Direct auth.users metadata update applied for {user_id} via service role"
@@ -1163,104 +1845,83 @@ async def update_user(
                         detail=f"Failed to update user: {str(auth_error)}"
                     )
 
-        # If we couldn't determine admin status from the update, fall back to the current profile
-        if not is_admin_role:
-            try:
-                current_user_response = supabase.auth.admin.get_user_by_id(user_id)
-                if current_user_response and current_user_response.user:
-                    app_meta = {}
-                    raw_app_metadata = getattr(current_user_response.user, 'app_metadata', None)
-                    if not raw_app_metadata:
-                        raw_app_metadata = getattr(current_user_response.user, 'raw_app_metadata', None)
-                    app_meta = raw_app_metadata or {}
-
-                    if app_meta.get('role') == 'admin':
-                        is_admin_role = True
-            except Exception as fetch_error:
-                logger.warning(f"Unable to fetch current user role for {user_id}: {fetch_error}")
+        # A successful update already told us the role; otherwise use the tenant
+        # rows fetched above instead of another Auth API round-trip
+        if not is_admin_role and auth_update_response is None:
+            is_admin_role = any(row.get("role") in _ADMIN_ROLES for row in tenant_rows)
 
         if requested_role is not None:
             final_is_admin = requested_role == 'admin'
         else:
             final_is_admin = is_admin_role
 
-        # Update permissions if provided
+        # The child-table sync and the tenant role update are independent of
+        # one another, so they run concurrently below
+        desired_permissions: Optional[List[Dict[str, str]]] = None
         if update_request.permissions is not None:
-            # Delete existing permissions
-            supabase.service.table("user_permissions")\
-                .delete()\
-                .eq("user_id", user_id)\
-                .execute()
-            
-            # Insert new permissions if any
-            if update_request.permissions:
-                permissions_data = [
-                    {
-                        "user_id": user_id,
-                        "section": perm["section"],
-                        "action": perm["action"]
-                    }
-                    for perm in update_request.permissions
-                ]
-                supabase.service.table("user_permissions")\
-                    .insert(permissions_data)\
-                    .execute()
-                logger.info(f"Updated {len(permissions_data)} permissions for user {user_id}")
-        
-        # Update cities if provided
+            desired_permissions = [
+                {"section": perm["section"], "action": perm["action"]}
+                for perm in update_request.permissions
+            ]
+
+        desired_cities: Optional[List[Dict[str, str]]] = None
         if update_request.cities is not None:
-            # Delete existing city assignments
-            supabase.service.table("users_city")\
-                .delete()\
-                .eq("user_id", user_id)\
-                .execute()
-            
-            # Insert new city assignments if any (restricted to current tenant scope)
+            # New city assignments are restricted to current tenant scope
+            filtered_cities: List[str] = []
             if update_request.cities and not final_is_admin:
-                if allowed_city_map:
-                    filtered_cities = []
-                    for city in update_request.cities:
-                        if not isinstance(city, str):
-                            continue
-                        key = city.strip().lower()
-                        if key in allowed_city_map:
-                            filtered_cities.append(allowed_city_map[key])
-                else:
-                    filtered_cities = [
-                        city.strip()
-                        for city in update_request.cities
-                        if isinstance(city, str) and city.strip()
-                    ]
-
-                if filtered_cities:
-                    cities_data = [
-                        {
-                            "user_id": user_id,
-                            "city_name": city
-                        }
-                        for city in filtered_cities
-                    ]
-                    supabase.service.table("users_city")\
-                        .insert(cities_data)\
-                        .execute()
-                    logger.info(f"Updated {len(cities_data)} city assignments for user {user_id}")
-                else:
-                    logger.info(f"No tenant-allowed cities provided for user {user_id}; skipping insert")
+                filtered_cities = filter_allowed_cities(update_request.cities, allowed_city_map)
+
+                if not filtered_cities:
+                    logger.info(f"No tenant-allowed cities provided for user {user_id}; clearing assignments")
             elif final_is_admin:
                 logger.info(f"User {user_id} is admin; skipped inserting city assignments")
+            desired_cities = [{"city_name": city} for city in filtered_cities]
 
-        # Clear cache and update tenant role only for current operator's tenant
-        logger.info(f"Tenant rows for user {user_id}: {tenant_rows}")
+        desired_departments: Optional[List[Dict[str, str]]] = None
+        if update_request.departments is not None:
+            desired_departments = [
+                {"department_id": str(dept_id)} for dept_id in update_request.departments
+            ]
 
-        if requested_role is not None and operator_tid:
+        async def sync_children():
+            if desired_permissions is None and desired_cities is None and desired_departments is None:
+                return
+            # All three child tables in one round-trip and one transaction
+            try:
+                await _execute(supabase.service.rpc("sync_user_children", {
+                    "p_user_id": user_id,
+                    "p_permissions": desired_permissions,
+                    "p_cities": desired_cities,
+                    "p_departments": desired_departments,
+                }))
+            except Exception as rpc_error:
+                logger.warning(f"sync_user_children not available, syncing tables directly: {rpc_error}")
+                syncs = []
+                if desired_permissions is not None:
+                    syncs.append(sync_child_table("user_permissions", user_id, ("section", "action"), desired_permissions))
+                if desired_cities is not None:
+                    syncs.append(sync_child_table("users_city", user_id, ("city_name",), desired_cities))
+                if desired_departments is not None:
+                    syncs.append(sync_child_table("user_departments", user_id, ("department_id",), desired_departments))
+                await asyncio.gather(*syncs)
+
+            if desired_permissions is not None:
+                logger.info(f"Updated {len(desired_permissions)} permissions for user {user_id}")
+            if desired_cities:
+                logger.info(f"Updated {len(desired_cities)} city assignments for user {user_id}")
+
+        async def upd_tenant_role():
+            # Update tenant role only for current operator's tenant
+            if requested_role is None or not operator_tid:
+                return
             new_role_value = "admin" if final_is_admin else "member"
             try:
-                update_query = supabase.service.table("user_tenants")\
-                    .update({"role": new_role_value, "is_active": True})\
-                    .eq("user_id", user_id)\
+                update_response = await _execute(
+                    supabase.service.table("user_tenants")
+                    .update({"role": new_role_value, "is_active": True})
+                    .eq("user_id", user_id)
                     .eq("tenant_id", operator_tid)
-
-                update_response = update_query.execute()
+                )
                 logger.info(
                     f"Updated tenant role for user {user_id} to {new_role_value} for tenant {operator_tid}; response: {update_response.data}"
                 )
@@ -1268,58 +1929,47 @@ async def update_user(
                 logger.warning(
                     f"Failed to update tenant role for {user_id} in tenant {operator_tid}: {tenant_role_error}"
                 )
-        
-        # Update departments if provided
-        if update_request.departments is not None:
-            # Delete existing department assignments
-            supabase.service.table("user_departments")\
-                .delete()\
-                .eq("user_id", user_id)\
-                .execute()
-
-            # Insert new department assignments if any
-            if update_request.departments:
-                departments_data = [
-                    {
-                        "user_id": user_id,
-                        "department_id": str(dept_id)
-                    }
-                    for dept_id in update_request.departments
-                ]
-                supabase.service.table("user_departments")\
-                    .insert(departments_data)\
-                    .execute()
 
-        # Invalidate backend auth cache for this user across all workers
-        # This ensures the user gets fresh permissions on their next request
-        if redis_client.is_connected:
-            # Production mode: Use Redis Pub/Sub to invalidate cache across all workers
-            try:
-                await redis_client.publish("auth_cache_invalidate", user_id)
-                logger.info(f"✅ Published cache invalidation message for user {user_id} to all workers via Redis")
-            except Exception as e:
-                logger.error(f"Failed to publish cache invalidation via Redis: {e}")
-                # Fallback to direct invalidation (at least clears this worker's cache)
-                invalidate_user_cache(user_id)
-                logger.info(f"⚠️ Fell back to local cache invalidation for user {user_id}")
-        else:
-            # Localhost/single-worker mode: Direct cache invalidation
-            invalidate_user_cache(user_id)
-            logger.info(f"ℹ️ Local cache invalidation for user {user_id} (Redis not connected)")
+        logger.info(f"Tenant rows for user {user_id}: {tenant_rows}")
 
-        # Clear cache
-        tenant_result = supabase.service.table("user_tenants")\
-            .select("tenant_id")\
-            .eq("user_id", user_id)\
-            .limit(1)\
-            .execute()
-        
-        if tenant_result.data and redis_client.is_connected:
-            cache_key = get_cache_key(tenant_result.data[0]["tenant_id"])
-        if operator_tid and redis_client.is_connected:
-            cache_key = get_cache_key(operator_tid)
-            await redis_client.delete(cache_key)
-            logger.info(f"Cleared cache for tenant {operator_tid}")
+        results = await asyncio.gather(
+            sync_children(), upd_tenant_role(),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        async def invalidate_auth_cache():
+            # Invalidate backend auth cache for this user across all workers
+            # This ensures the user gets fresh permissions on their next request
+            if redis_client.is_connected:
+                # Production mode: Use Redis Pub/Sub to invalidate cache across all workers
+                try:
+                    await redis_client.publish("auth_cache_invalidate", user_id)
+                    logger.info(f"✅ Published cache invalidation message for user {user_id} to all workers via Redis")
+                except Exception as e:
+                    logger.error(f"Failed to publish cache invalidation via Redis: {e}")
+                    # Fallback to direct invalidation (at least clears this worker's cache)
+                    invalidate_user_cache(user_id)
+                    logger.info(f"⚠️ Fell back to local cache invalidation for user {user_id}")
+            else:
+                # Localhost/single-worker mode: Direct cache invalidation
+                invalidate_user_cache(user_id)
+                logger.info(f"ℹ️ Local cache invalidation for user {user_id} (Redis not connected)")
+
+        # Clear cache for the operator's tenant, or the user's own tenant from
+        # the rows fetched at the start of the request
+        cache_tid = operator_tid or (tenant_rows[0].get("tenant_id") if tenant_rows else None)
+        invalidations = [
+            invalidate_auth_cache(),
+            invalidate_user_tenant_cache(user_id),
+            invalidate_user_detail_cache(user_id),
+        ]
+        if cache_tid:
+            invalidations.append(bump_tenant_generation(cache_tid))
+        # The publish and cache deletes are independent Redis round-trips
+        await asyncio.gather(*invalidations)
 
         return {"message": "User updated successfully"}
         
@@ -1335,7 +1985,7 @@ async def delete_user(
 ):
     """Soft delete a user"""
     try:
-        response = supabase.auth.admin.get_user_by_id(user_id)
+        response = await _run_blocking(supabase.auth.admin.get_user_by_id, user_id)
         if not response or not response.user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -1344,25 +1994,23 @@ async def delete_user(
         current_metadata["deleted_at"] = datetime.now().isoformat()
         current_metadata["status"] = "inactive"
         
-        supabase.auth.admin.update_user_by_id(user_id, {
+        await _run_blocking(supabase.auth.admin.update_user_by_id, user_id, {
             "user_metadata": current_metadata
         })
         
-        supabase.service.table("user_tenants")\
-            .update({"is_active": False})\
-            .eq("user_id", user_id)\
-            .execute()
-        
+        # Deactivate memberships; the updated rows name every tenant to clear
+        deactivated = await _execute(
+            supabase.service.table("user_tenants")
+            .update({"is_active": False})
+            .eq("user_id", user_id)
+        )
+
         # Clear cache
-        tenant_result = supabase.service.table("user_tenants")\
-            .select("tenant_id")\
-            .eq("user_id", user_id)\
-            .limit(1)\
-            .execute()
-        
-        if tenant_result.data and redis_client.is_connected:
-            cache_key = get_cache_key(tenant_result.data[0]["tenant_id"])
-            await redis_client.delete(cache_key)
+        await asyncio.gather(
+            invalidate_user_tenant_cache(user_id),
+            invalidate_user_detail_cache(user_id),
+            bump_tenant_generations([row.get("tenant_id") for row in deactivated.data or []]),
+        )
         
         return {"message": "User deleted successfully"}
         
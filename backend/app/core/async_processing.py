@@ -4,17 +4,24 @@ Provides background task processing and concurrent request handling
 to improve response times and system throughput
 """
 import asyncio
+import heapq
+import itertools
 import logging
-from typing import Callable, Any, Dict, List, Optional, Union
-from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Any, Dict, List, Optional, Tuple, Union
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 import time
 import uuid
 from dataclasses import dataclass, field
+from functools import partial
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# Cleanup wakes at least this often, and no sooner than this after the last pass
+MAX_CLEANUP_INTERVAL_SECONDS = 3600
+MIN_CLEANUP_INTERVAL_SECONDS = 60
+
 class TaskStatus(Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
@@ -22,49 +29,171 @@ class TaskStatus(Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+class ShardedThreadPoolExecutor(Executor):
+    """Thread pool split into independent shards, each with its own work queue
+    and locks. Submissions are spread round-robin so concurrent callers don't
+    all contend on a single queue.
+    """
+
+    def __init__(self, shards: int, workers_per_shard: int, thread_name_prefix: str = ""):
+        self._shards = [
+            ThreadPoolExecutor(max_workers=workers_per_shard, thread_name_prefix=f"{thread_name_prefix}{i}_")
+            for i in range(shards)
+        ]
+        self._next_shard = itertools.count()
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        shard = self._shards[next(self._next_shard) % len(self._shards)]
+        return shard.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        for shard in self._shards:
+            shard.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
 @dataclass
 class AsyncTask:
-    """Represents an async task with metadata"""
+    """Represents an async task with metadata
+
+    Timestamps are epoch seconds (time.time()); the *_dt properties convert
+    them to datetimes for serialization.
+    """
     id: str
     name: str
     user_id: str
     tenant_id: str
     status: TaskStatus = TaskStatus.PENDING
-    created_at: datetime = field(default_factory=datetime.now)
-    started_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    completed_at: Optional[float] = None
     result: Any = None
-    error: Optional[str] = None
+    error: Optional[BaseException] = None
     progress: float = 0.0
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    @property
+    def created_at_dt(self) -> datetime:
+        return _to_datetime(self.created_at)
+
+    @property
+    def started_at_dt(self) -> Optional[datetime]:
+        return _to_datetime(self.started_at)
+
+    @property
+    def completed_at_dt(self) -> Optional[datetime]:
+        return _to_datetime(self.completed_at)
+
+    @property
+    def error_message(self) -> Optional[str]:
+        return str(self.error) if self.error is not None else None
+
 class AsyncProcessor:
     """
     High-performance async processing service for concurrent operations
     """
     
-    def __init__(self, max_workers: int = 10, max_concurrent_tasks: int = 50):
+    def __init__(self, max_workers: int = 10, max_concurrent_tasks: int = 50, executor_shards: int = 1):
         self.max_workers = max_workers
         self.max_concurrent_tasks = max_concurrent_tasks
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = ShardedThreadPoolExecutor(
+            shards=executor_shards,
+            workers_per_shard=-(-max_workers // executor_shards),
+            thread_name_prefix="async_task_",
+        )
         
         # Task management
         self.tasks: Dict[str, AsyncTask] = {}
         self.active_tasks: Dict[str, asyncio.Task] = {}
+        # Per-user index in submission order: user_id -> {task_id: task}
+        self.tasks_by_user: Dict[str, Dict[str, AsyncTask]] = {}
         
         # Performance tracking
         self.total_tasks_processed = 0
         self.total_processing_time = 0.0
         self.task_cleanup_threshold = timedelta(hours=24)  # Clean up tasks after 24h
         
+        # Finished tasks ordered by completion time: (completed_at timestamp, task_id)
+        self._expiry_heap: List[Tuple[float, str]] = []
+        
         # Rate limiting
         self.user_task_limits: Dict[str, int] = {}  # user_id -> active_task_count
         self.max_user_concurrent_tasks = 5
         
+        # Per-user and overall status counters, maintained on every status transition
+        self.user_status_counts: Dict[str, Dict[str, int]] = {}  # user_id -> {status: count}
+        self.status_counts: Dict[str, int] = {status.value: 0 for status in TaskStatus}
+        
         # Background cleanup task
         self._cleanup_task = None
         self._shutdown = False
     
+    def _set_status(self, task: AsyncTask, new_status: TaskStatus):
+        """Transition a task to a new status and keep the per-user counters in sync"""
+        old_status = task.status
+        if old_status == new_status:
+            return
+        task.status = new_status
+        counts = self.user_status_counts.setdefault(task.user_id, {})
+        counts[old_status.value] = counts.get(old_status.value, 0) - 1
+        counts[new_status.value] = counts.get(new_status.value, 0) + 1
+        self.status_counts[old_status.value] -= 1
+        self.status_counts[new_status.value] += 1
+    
+    def _forget_task(self, task: AsyncTask):
+        """Drop a task from the per-user index and counters when it is removed from memory"""
+        user_tasks = self.tasks_by_user.get(task.user_id)
+        if user_tasks is not None:
+            user_tasks.pop(task.id, None)
+            if not user_tasks:
+                del self.tasks_by_user[task.user_id]
+        
+        self.status_counts[task.status.value] -= 1
+        
+        counts = self.user_status_counts.get(task.user_id)
+        if counts is None:
+            return
+        counts[task.status.value] = counts.get(task.status.value, 0) - 1
+        if not any(counts.values()):
+            del self.user_status_counts[task.user_id]
+    
+    def _reserve_slot(self, user_id: str):
+        """Check the user and global limits and count the new task against the user
+
+        Deliberately synchronous: with no await between the check and the
+        increment, concurrent submissions can't both pass the same check.
+        """
+        user_active_tasks = self.user_task_limits.get(user_id, 0)
+        if user_active_tasks >= self.max_user_concurrent_tasks:
+            raise ValueError(f"User {user_id} has reached maximum concurrent tasks limit ({self.max_user_concurrent_tasks})")
+        
+        if len(self.active_tasks) >= self.max_concurrent_tasks:
+            raise ValueError(f"System has reached maximum concurrent tasks limit ({self.max_concurrent_tasks})")
+        
+        self.user_task_limits[user_id] = user_active_tasks + 1
+    
+    @staticmethod
+    def _describe_args(args: tuple, kwargs: dict) -> Dict[str, Any]:
+        """Task metadata describing its arguments without rendering large payloads
+
+        The truncated repr is only built when debug logging is on; otherwise
+        just the argument types are recorded.
+        """
+        metadata: Dict[str, Any] = {"kwargs_keys": tuple(kwargs)}
+        if logger.isEnabledFor(logging.DEBUG):
+            metadata["args"] = repr(args)[:200]  # Truncate for storage
+        else:
+            metadata["arg_types"] = [type(arg).__name__ for arg in args]
+        return metadata
+    
+    def _mark_finished(self, task: AsyncTask, status: TaskStatus):
+        """Move a task to a terminal status and schedule it for cleanup"""
+        self._set_status(task, status)
+        if task.completed_at is None:
+            task.completed_at = time.time()
+            heapq.heappush(self._expiry_heap, (task.completed_at, task.id))
+    
     def start_background_cleanup(self):
         """Start background task cleanup service"""
         if self._cleanup_task is None or self._cleanup_task.done():
@@ -72,30 +201,34 @@ class AsyncProcessor:
             logger.info("Async processor background cleanup started")
     
     async def _cleanup_old_tasks(self):
-        """Clean up old completed tasks to prevent memory leaks"""
+        """Clean up old completed tasks to prevent memory leaks
+
+        Only the expired head of the expiry heap is visited, and the loop
+        sleeps until the oldest remaining task is due instead of a fixed hour.
+        """
+        threshold = self.task_cleanup_threshold.total_seconds()
         while not self._shutdown:
             try:
-                current_time = datetime.now()
-                tasks_to_remove = []
-                
-                for task_id, task in self.tasks.items():
-                    # Remove tasks that are old and completed/failed
-                    if (task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED] and
-                        task.completed_at and 
-                        current_time - task.completed_at > self.task_cleanup_threshold):
-                        tasks_to_remove.append(task_id)
+                cutoff = time.time() - threshold
+                removed = 0
                 
-                # Remove old tasks
-                for task_id in tasks_to_remove:
-                    del self.tasks[task_id]
-                    if task_id in self.active_tasks:
-                        del self.active_tasks[task_id]
+                while self._expiry_heap and self._expiry_heap[0][0] < cutoff:
+                    _, task_id = heapq.heappop(self._expiry_heap)
+                    task = self.tasks.pop(task_id, None)
+                    if task is None:
+                        continue
+                    self._forget_task(task)
+                    self.active_tasks.pop(task_id, None)
+                    removed += 1
                 
-                if tasks_to_remove:
-                    logger.info(f"Cleaned up {len(tasks_to_remove)} old async tasks")
+                if removed:
+                    logger.info(f"Cleaned up {removed} old async tasks")
                 
-                # Sleep for 1 hour between cleanup cycles
-                await asyncio.sleep(3600)
+                # Sleep until the oldest remaining task expires, at most 1 hour
+                sleep_for = MAX_CLEANUP_INTERVAL_SECONDS
+                if self._expiry_heap:
+                    sleep_for = min(sleep_for, self._expiry_heap[0][0] + threshold - time.time())
+                await asyncio.sleep(max(sleep_for, MIN_CLEANUP_INTERVAL_SECONDS))
                 
             except Exception as e:
                 logger.error(f"Error in async task cleanup: {e}")
@@ -116,14 +249,8 @@ class AsyncProcessor:
         Returns:
             task_id: Unique identifier for tracking the task
         """
-        # Check user rate limits
-        user_active_tasks = self.user_task_limits.get(user_id, 0)
-        if user_active_tasks >= self.max_user_concurrent_tasks:
-            raise ValueError(f"User {user_id} has reached maximum concurrent tasks limit ({self.max_user_concurrent_tasks})")
-        
-        # Check global task limits
-        if len(self.active_tasks) >= self.max_concurrent_tasks:
-            raise ValueError(f"System has reached maximum concurrent tasks limit ({self.max_concurrent_tasks})")
+        # Check user and global limits and take the user's slot
+        self._reserve_slot(user_id)
         
         # Create task
         task_id = str(uuid.uuid4())
@@ -132,48 +259,47 @@ class AsyncProcessor:
             name=name,
             user_id=user_id,
             tenant_id=tenant_id,
-            metadata={
-                "args": str(args)[:200],  # Truncate for storage
-                "kwargs_keys": list(kwargs.keys())
-            }
+            metadata=self._describe_args(args, kwargs)
         )
         
         self.tasks[task_id] = task
+        self.tasks_by_user.setdefault(user_id, {})[task_id] = task
+        counts = self.user_status_counts.setdefault(user_id, {})
+        counts[task.status.value] = counts.get(task.status.value, 0) + 1
+        self.status_counts[task.status.value] += 1
         
-        # Update user rate limiting
-        self.user_task_limits[user_id] = user_active_tasks + 1
-        
-        # Start the async task
-        async_task = asyncio.create_task(self._execute_task(task, func, *args, **kwargs))
+        # Start the async task, resolving sync vs async once at submission
+        is_coroutine = asyncio.iscoroutinefunction(func)
+        async_task = asyncio.create_task(self._execute_task(task, func, is_coroutine, *args, **kwargs))
         self.active_tasks[task_id] = async_task
         
         logger.info(f"Submitted async task {task_id} ({name}) for user {user_id}")
         return task_id
     
-    async def _execute_task(self, task: AsyncTask, func: Callable, *args, **kwargs) -> Any:
+    async def _execute_task(
+        self, task: AsyncTask, func: Callable, is_coroutine: bool, *args, **kwargs
+    ) -> Any:
         """Execute a task and update its status"""
         try:
-            task.status = TaskStatus.IN_PROGRESS
-            task.started_at = datetime.now()
-            
-            start_time = time.time()
+            self._set_status(task, TaskStatus.IN_PROGRESS)
+            task.started_at = time.time()
             
             # Execute the function (handles both sync and async functions)
-            if asyncio.iscoroutinefunction(func):
+            if is_coroutine:
                 result = await func(*args, **kwargs)
             else:
-                # Run CPU-bound sync functions in thread pool
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(self.executor, func, *args, **kwargs)
+                # Run CPU-bound sync functions in thread pool; run_in_executor
+                # takes no kwargs, so bind everything up front
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
             
             # Update task completion
             task.result = result
-            task.status = TaskStatus.COMPLETED
-            task.completed_at = datetime.now()
+            self._mark_finished(task, TaskStatus.COMPLETED)
             task.progress = 1.0
             
             # Performance tracking
-            processing_time = time.time() - start_time
+            processing_time = task.completed_at - task.started_at
             self.total_tasks_processed += 1
             self.total_processing_time += processing_time
             
@@ -181,15 +307,13 @@ class AsyncProcessor:
             return result
             
         except asyncio.CancelledError:
-            task.status = TaskStatus.CANCELLED
-            task.completed_at = datetime.now()
+            self._mark_finished(task, TaskStatus.CANCELLED)
             logger.info(f"Cancelled async task {task.id} ({task.name})")
             raise
             
         except Exception as e:
-            task.status = TaskStatus.FAILED
-            task.error = str(e)
-            task.completed_at = datetime.now()
+            self._mark_finished(task, TaskStatus.FAILED)
+            task.error = e
             logger.error(f"Failed async task {task.id} ({task.name}): {e}")
             raise
             
@@ -198,21 +322,39 @@ class AsyncProcessor:
             if task.id in self.active_tasks:
                 del self.active_tasks[task.id]
             
-            # Update user rate limiting
-            user_active_count = self.user_task_limits.get(task.user_id, 0)
-            if user_active_count > 0:
-                self.user_task_limits[task.user_id] = user_active_count - 1
-            
-            if self.user_task_limits.get(task.user_id, 0) == 0:
-                del self.user_task_limits[task.user_id]
+            # Update user rate limiting: one read, then either drop or store
+            remaining = self.user_task_limits.get(task.user_id, 0) - 1
+            if remaining > 0:
+                self.user_task_limits[task.user_id] = remaining
+            else:
+                self.user_task_limits.pop(task.user_id, None)
     
     async def get_task_status(self, task_id: str) -> Optional[AsyncTask]:
         """Get status of a specific task"""
         return self.tasks.get(task_id)
     
-    async def get_user_tasks(self, user_id: str) -> List[AsyncTask]:
-        """Get all tasks for a specific user"""
-        return [task for task in self.tasks.values() if task.user_id == user_id]
+    async def get_user_tasks(
+        self,
+        user_id: str,
+        status: Optional[TaskStatus] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[AsyncTask]:
+        """Get tasks for a specific user, newest first, optionally filtered by status and paginated"""
+        # The index is in submission order, so newest first is just its reverse
+        user_tasks = [
+            task for task in reversed(self.tasks_by_user.get(user_id, {}).values())
+            if status is None or task.status == status
+        ]
+        
+        if limit is None:
+            return user_tasks[offset:]
+        return user_tasks[offset:offset + limit]
+    
+    def get_user_counters(self, user_id: str) -> Dict[str, int]:
+        """Get pre-aggregated task counts by status for a specific user"""
+        counts = self.user_status_counts.get(user_id, {})
+        return {status.value: counts.get(status.value, 0) for status in TaskStatus}
     
     async def cancel_task(self, task_id: str) -> bool:
         """Cancel a pending or in-progress task"""
@@ -222,7 +364,8 @@ class AsyncProcessor:
                 async_task.cancel()
                 
                 if task_id in self.tasks:
-                    self.tasks[task_id].status = TaskStatus.CANCELLED
+                    # Also covers tasks cancelled before they started running
+                    self._mark_finished(self.tasks[task_id], TaskStatus.CANCELLED)
                 
                 logger.info(f"Cancelled async task {task_id}")
                 return True
@@ -237,7 +380,7 @@ class AsyncProcessor:
                 if task.status == TaskStatus.COMPLETED:
                     return task.result
                 elif task.status == TaskStatus.FAILED:
-                    raise Exception(task.error)
+                    raise task.error
                 else:
                     raise ValueError(f"Task {task_id} is not running")
             else:
@@ -274,14 +417,15 @@ class AsyncProcessor:
         if not items:
             return []
         
-        # Split items into batches
-        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        # Batches are sliced out of items only once a slot is free, so at most
+        # max_concurrent batch copies are being built at any time
+        batch_starts = range(0, len(items), batch_size)
         task_ids = []
         
         # Process batches with concurrency limit
         semaphore = asyncio.Semaphore(max_concurrent)
         
-        async def process_batch(batch_items, batch_index):
+        async def process_batch(start, batch_index):
             async with semaphore:
                 batch_name = f"{name}_batch_{batch_index}"
                 return await self.submit_task(
@@ -289,16 +433,22 @@ class AsyncProcessor:
                     func,
                     user_id,
                     tenant_id,
-                    batch_items
+                    items[start:start + batch_size]
                 )
         
-        # Submit all batch tasks
-        batch_tasks = [
-            process_batch(batch, i) 
-            for i, batch in enumerate(batches)
-        ]
+        # Submit all batch tasks; the group cancels the remaining submissions
+        # as soon as one is rejected
+        try:
+            async with asyncio.TaskGroup() as tg:
+                batch_tasks = [
+                    tg.create_task(process_batch(start, i))
+                    for i, start in enumerate(batch_starts)
+                ]
+        except ExceptionGroup as eg:
+            # Keep raising the submit_task error itself, as gather did
+            raise eg.exceptions[0]
         
-        task_ids = await asyncio.gather(*batch_tasks)
+        task_ids = [batch_task.result() for batch_task in batch_tasks]
         logger.info(f"Started batch processing: {len(task_ids)} batches for {len(items)} items")
         
         return task_ids
@@ -306,8 +456,8 @@ class AsyncProcessor:
     def get_stats(self) -> Dict[str, Any]:
         """Get processing statistics"""
         active_count = len(self.active_tasks)
-        completed_count = len([t for t in self.tasks.values() if t.status == TaskStatus.COMPLETED])
-        failed_count = len([t for t in self.tasks.values() if t.status == TaskStatus.FAILED])
+        completed_count = self.status_counts[TaskStatus.COMPLETED.value]
+        failed_count = self.status_counts[TaskStatus.FAILED.value]
         
         avg_processing_time = (
             self.total_processing_time / self.total_tasks_processed 
@@ -334,18 +484,19 @@ class AsyncProcessor:
         if self._cleanup_task and not self._cleanup_task.done():
             self._cleanup_task.cancel()
         
-        # Cancel all active tasks
-        for task_id, async_task in self.active_tasks.items():
+        # Cancel all active tasks; snapshot first, since each task removes
+        # itself from active_tasks as it finishes
+        active = list(self.active_tasks.values())
+        for async_task in active:
             if not async_task.done():
                 async_task.cancel()
         
         # Wait for all tasks to complete or timeout
-        if self.active_tasks:
-            await asyncio.wait(
-                self.active_tasks.values(),
-                timeout=30,
-                return_when=asyncio.ALL_COMPLETED
-            )
+        if active:
+            try:
+                await asyncio.wait_for(asyncio.gather(*active, return_exceptions=True), timeout=30)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out waiting for async tasks to cancel during shutdown")
         
         # Shutdown thread pool
         self.executor.shutdown(wait=True)
@@ -353,7 +504,7 @@ class AsyncProcessor:
         logger.info("Async processor shutdown completed")
 
 # Global async processor instance
-async_processor = AsyncProcessor(max_workers=15, max_concurrent_tasks=100)
+async_processor = AsyncProcessor(max_workers=15, max_concurrent_tasks=100, executor_shards=3)
 
 # Utility functions for common async patterns
 async def process_concurrently(
@@ -364,18 +515,27 @@ async def process_concurrently(
 ) -> List[Any]:
     """
     Process a list of items concurrently with optional timeout
+
+    A fixed set of max_concurrent workers pulls items from a shared iterator,
+    so only that many coroutines exist at once however long the list is.
+    Results (or raised exceptions) come back in input order.
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
+    results: List[Any] = [None] * len(items)
+    pending = iter(enumerate(items))
     
-    async def process_item(item):
-        async with semaphore:
-            if timeout_per_item:
-                return await asyncio.wait_for(func(item), timeout=timeout_per_item)
-            else:
-                return await func(item)
+    async def worker():
+        # Single-threaded event loop: next() on the shared iterator is safe
+        for index, item in pending:
+            try:
+                if timeout_per_item:
+                    results[index] = await asyncio.wait_for(func(item), timeout=timeout_per_item)
+                else:
+                    results[index] = await func(item)
+            except Exception as e:
+                results[index] = e
     
-    tasks = [process_item(item) for item in items]
-    return await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.gather(*(worker() for _ in range(min(max_concurrent, len(items)))))
+    return results
 
 async def timeout_wrapper(coro, timeout: float, default=None):
     """
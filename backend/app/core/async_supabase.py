@@ -2,97 +2,114 @@
 Async wrapper for Supabase client to prevent blocking the event loop
 """
 import asyncio
-from functools import partial
-from typing import Any, Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor
+import re
+from typing import Any, Callable, Dict, List, Optional
 from ..database import supabase
+from .async_processing import ShardedThreadPoolExecutor
 
 # Enhanced thread pool for database operations with better connection handling
-# Increased pool size to handle concurrent upsell purchase operations
-executor = ThreadPoolExecutor(max_workers=50, thread_name_prefix="supabase_")
+# Increased pool size to handle concurrent upsell purchase operations; sharded
+# 5 x 10 workers so concurrent submitters don't queue on one lock
+executor = ShardedThreadPoolExecutor(shards=5, workers_per_shard=10, thread_name_prefix="supabase_")
 
 # Connection pooling settings to prevent connection terminated errors
 import time
 import logging
-from threading import Lock
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
-# Enhanced connection health tracking with configurable thresholds
+# Enhanced connection health tracking with configurable thresholds.
+# Every caller is a coroutine on the event loop thread (the executor only runs
+# the query itself), so the tracker needs no lock; its state is advisory anyway.
+# Per-operation retry state lives on the retrying coroutine's stack; the
+# tracker only keeps the global gauges.
 class ConnectionTracker:
     def __init__(self):
         self.failed_connections = 0
         self.last_failure = None
-        self.lock = Lock()
         self.max_retries = settings.database_max_retries
         self.base_delay = settings.database_retry_delay
         self.failure_threshold = 5  # Configurable failure threshold
         self.throttle_duration = 30  # Configurable throttle duration
         
-        # Track retry attempts per operation
-        self.retry_counts = {}
-        self.operation_timeouts = {}
+        # Operations currently waiting to retry
+        self.active_retries = 0
     
-    def record_failure(self, operation_id: str = None):
-        with self.lock:
-            self.failed_connections += 1
-            self.last_failure = time.time()
-            
-            if operation_id:
-                self.retry_counts[operation_id] = self.retry_counts.get(operation_id, 0) + 1
+    def record_failure(self, error_type: str = None):
+        self.failed_connections += 1
+        self.last_failure = time.time()
     
-    def record_success(self, operation_id: str = None):
-        with self.lock:
-            self.failed_connections = max(0, self.failed_connections - 1)
-            
-            if operation_id and operation_id in self.retry_counts:
-                del self.retry_counts[operation_id]
+    def record_success(self):
+        if self.failed_connections:
+            self.failed_connections -= 1
     
     def should_throttle(self):
-        with self.lock:
-            if self.failed_connections > self.failure_threshold and self.last_failure:
-                return time.time() - self.last_failure < self.throttle_duration
-            return False
-    
-    def should_retry(self, operation_id: str, error_type: str = None) -> bool:
-        """Check if an operation should be retried based on retry count and error type"""
-        with self.lock:
-            retry_count = self.retry_counts.get(operation_id, 0)
+        if self.failed_connections > self.failure_threshold and self.last_failure:
+            return time.time() - self.last_failure < self.throttle_duration
+        return False
+
+connection_tracker = ConnectionTracker()
+
+# Error classes for retry logic, checked in order; first match wins
+_ERROR_PATTERNS = (
+    (re.compile(
+        r"resource temporarily unavailable|connection (?:reset|terminated|refused)|pool exhausted",
+        re.IGNORECASE,
+    ), "connection"),
+    (re.compile(r"timeout|timed out", re.IGNORECASE), "timeout"),
+    (re.compile(r"pool.*exhausted|exhausted.*pool", re.IGNORECASE | re.DOTALL), "pool_exhausted"),
+)
+
+def _classify_error(error: Exception) -> Optional[str]:
+    """Map a query error to 'connection', 'timeout', 'pool_exhausted' or None"""
+    error_msg = str(error)
+    for pattern, error_type in _ERROR_PATTERNS:
+        if pattern.search(error_msg):
+            return error_type
+    return None
+
+async def _execute_with_retry(what: str, call: Callable, *args) -> Any:
+    """Run a blocking Supabase call on the executor, retrying failures with
+    exponential backoff (base_delay * 2^attempt, capped at 30s)"""
+    # Check if we should throttle due to connection issues
+    if connection_tracker.should_throttle():
+        logger.warning(f"Throttling {what} due to connection issues")
+        await asyncio.sleep(2)  # Longer delay to let connections recover
+    
+    loop = asyncio.get_running_loop()
+    max_retries = connection_tracker.max_retries
+    base_delay = connection_tracker.base_delay
+    label = what[0].upper() + what[1:]
+    retry_count = 0
+    
+    while True:
+        try:
+            result = await loop.run_in_executor(executor, call, *args)
+            connection_tracker.record_success()
+            return result
             
-            # Don't retry if we've exceeded max retries
-            if retry_count >= self.max_retries:
-                return False
+        except Exception as e:
+            # Classify error type for retry logic
+            connection_tracker.record_failure(_classify_error(e))
+            retry_count += 1
             
-            # Always retry connection-related errors
-            if error_type and error_type in ['connection', 'timeout', 'pool_exhausted']:
-                return True
+            # Check if we should retry
+            if retry_count < max_retries:
+                delay = min(base_delay * (1 << retry_count), 30.0)
+                logger.warning(
+                    f"{label} failed (attempt {retry_count}/{max_retries}), "
+                    f"retrying in {delay}s: {str(e)}"
+                )
+                connection_tracker.active_retries += 1
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    connection_tracker.active_retries -= 1
+                continue
             
-            # Retry other errors up to max_retries
-            return retry_count < self.max_retries
-    
-    def get_retry_delay(self, operation_id: str) -> float:
-        """Get exponential backoff delay for retry"""
-        with self.lock:
-            retry_count = self.retry_counts.get(operation_id, 0)
-            # Exponential backoff: base_delay * 2^retry_count, capped at 30 seconds
-            delay = min(self.base_delay * (2 ** retry_count), 30.0)
-            return delay
-    
-    def cleanup_old_operations(self):
-        """Clean up old operation tracking data"""
-        current_time = time.time()
-        with self.lock:
-            # Remove operations older than 5 minutes
-            old_operations = [
-                op_id for op_id, timestamp in self.operation_timeouts.items()
-                if current_time - timestamp > 300
-            ]
-            for op_id in old_operations:
-                self.retry_counts.pop(op_id, None)
-                self.operation_timeouts.pop(op_id, None)
-
-connection_tracker = ConnectionTracker()
+            logger.error(f"{label} failed after {retry_count} attempts: {str(e)}")
+            raise
 
 class AsyncSupabase:
     """Async wrapper for Supabase operations"""
@@ -102,7 +119,7 @@ class AsyncSupabase:
         
     async def execute_async(self, operation):
         """Execute a Supabase operation asynchronously"""
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         return await loop.run_in_executor(executor, operation)
     
     def table(self, table_name: str):
@@ -212,58 +229,10 @@ class AsyncTable:
     
     async def execute(self):
         """Execute the built query asynchronously with enhanced connection health tracking and retry logic"""
-        import uuid
-        operation_id = str(uuid.uuid4())
-        
-        # Check if we should throttle due to connection issues
-        if connection_tracker.should_throttle():
-            logger.warning("Throttling database query due to connection issues")
-            await asyncio.sleep(2)  # Longer delay to let connections recover
-        
-        loop = asyncio.get_event_loop()
-        
-        while connection_tracker.should_retry(operation_id):
-            try:
-                result = await loop.run_in_executor(executor, self._query.execute)
-                connection_tracker.record_success(operation_id)
-                return result
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Classify error type for retry logic
-                error_type = None
-                if any(phrase in error_msg for phrase in [
-                    'resource temporarily unavailable',
-                    'connection reset',
-                    'connection terminated',
-                    'connection refused',
-                    'pool exhausted'
-                ]):
-                    error_type = 'connection'
-                elif any(phrase in error_msg for phrase in ['timeout', 'timed out']):
-                    error_type = 'timeout'
-                elif 'pool' in error_msg and 'exhausted' in error_msg:
-                    error_type = 'pool_exhausted'
-                
-                connection_tracker.record_failure(operation_id, error_type)
-                
-                # Check if we should retry
-                if connection_tracker.should_retry(operation_id, error_type):
-                    delay = connection_tracker.get_retry_delay(operation_id)
-                    retry_count = connection_tracker.retry_counts.get(operation_id, 0)
-                    logger.warning(
-                        f"Database query failed (attempt {retry_count}/{settings.database_max_retries}), "
-                        f"retrying in {delay}s: {str(e)}"
-                    )
-                    await asyncio.sleep(delay)
-                    continue
-                else:
-                    retry_count = connection_tracker.retry_counts.get(operation_id, 0)
-                    logger.error(f"Database query failed after {retry_count} attempts: {str(e)}")
-                    # Clean up tracking for this operation
-                    connection_tracker.record_success(operation_id)
-                    raise
+        return await _execute_with_retry("database query", self._query.execute)
+
+def _run_rpc(client, function_name: str, params: Dict):
+    return client.rpc(function_name, params).execute()
 
 class AsyncRPC:
     """Async wrapper for Supabase RPC operations"""
@@ -275,60 +244,7 @@ class AsyncRPC:
     
     async def execute(self):
         """Execute the RPC call asynchronously with enhanced connection health tracking and retry logic"""
-        import uuid
-        operation_id = str(uuid.uuid4())
-        
-        # Check if we should throttle due to connection issues
-        if connection_tracker.should_throttle():
-            logger.warning("Throttling RPC call due to connection issues")
-            await asyncio.sleep(2)  # Longer delay to let connections recover
-        
-        loop = asyncio.get_event_loop()
-        
-        while connection_tracker.should_retry(operation_id):
-            try:
-                rpc_call = partial(self.client.rpc, self.function_name, self.params)
-                rpc_query = await loop.run_in_executor(executor, rpc_call)
-                result = await loop.run_in_executor(executor, rpc_query.execute)
-                connection_tracker.record_success(operation_id)
-                return result
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Classify error type for retry logic
-                error_type = None
-                if any(phrase in error_msg for phrase in [
-                    'resource temporarily unavailable',
-                    'connection reset',
-                    'connection terminated',
-                    'connection refused',
-                    'pool exhausted'
-                ]):
-                    error_type = 'connection'
-                elif any(phrase in error_msg for phrase in ['timeout', 'timed out']):
-                    error_type = 'timeout'
-                elif 'pool' in error_msg and 'exhausted' in error_msg:
-                    error_type = 'pool_exhausted'
-                
-                connection_tracker.record_failure(operation_id, error_type)
-                
-                # Check if we should retry
-                if connection_tracker.should_retry(operation_id, error_type):
-                    delay = connection_tracker.get_retry_delay(operation_id)
-                    retry_count = connection_tracker.retry_counts.get(operation_id, 0)
-                    logger.warning(
-                        f"RPC call failed (attempt {retry_count}/{settings.database_max_retries}), "
-                        f"retrying in {delay}s: {str(e)}"
-                    )
-                    await asyncio.sleep(delay)
-                    continue
-                else:
-                    retry_count = connection_tracker.retry_counts.get(operation_id, 0)
-                    logger.error(f"RPC call failed after {retry_count} attempts: {str(e)}")
-                    # Clean up tracking for this operation
-                    connection_tracker.record_success(operation_id)
-                    raise
+        return await _execute_with_retry("RPC call", _run_rpc, self.client, self.function_name, self.params)
 
 # Global async Supabase client
 async_supabase = AsyncSupabase(supabase)
\ No newline at end of file
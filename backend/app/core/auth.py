@@ -20,6 +20,26 @@ security = HTTPBearer(auto_error=False)
 auth_cache = {}
 CACHE_DURATION = 1800  # 30 minutes (increased from 5 minutes for better performance)
 
+# Keyed digest so cache keys cannot be derived from a token without the server secret
+_AUTH_CACHE_KEY = hashlib.sha256(settings.secret_key.encode()).digest()
+
+
+def auth_cache_key(token: str) -> str:
+    """Cache key for a bearer token (keyed BLAKE2s digest, the raw token is never stored)"""
+    return hashlib.blake2s(token.encode(), key=_AUTH_CACHE_KEY, digest_size=16).hexdigest()
+
+
+def _auth_cache_expiry(token: str, now: float) -> float:
+    """Cache entries live for CACHE_DURATION but never past the token's own exp claim"""
+    expiry = now + CACHE_DURATION
+    try:
+        token_exp = jwt.get_unverified_claims(token).get("exp")
+        if isinstance(token_exp, (int, float)):
+            expiry = min(expiry, float(token_exp))
+    except JWTError:
+        pass
+    return expiry
+
 
 def clear_auth_cache():
     """Clear authentication cache"""
@@ -78,12 +98,12 @@ async def authenticate_request(
 
     token = credentials.credentials
     # Create cache key from token hash (more secure than storing full token)
-    token_hash = hashlib.sha256(token.encode()).hexdigest()[:16]
+    token_hash = auth_cache_key(token)
 
     # Check cache first
     if token_hash in auth_cache:
         cached_data = auth_cache[token_hash]
-        if datetime.now().timestamp() - cached_data["timestamp"] < CACHE_DURATION:
+        if datetime.now().timestamp() < cached_data["expires_at"]:
             cached_user = cached_data["user"]
             # If not, force a refresh to get proper tenant isolation
             if not cached_user.tenant_id:
@@ -278,14 +298,15 @@ async def authenticate_request(
         )
 
         # Cache the authentication result
+        current_time = datetime.now().timestamp()
         auth_cache[token_hash] = {
             "user": auth_user,
-            "timestamp": datetime.now().timestamp(),
+            "timestamp": current_time,
+            "expires_at": _auth_cache_expiry(token, current_time),
         }
 
         # Clean up old cache entries (keep cache size manageable)
-        current_time = datetime.now().timestamp()
-        expired_keys = [k for k, v in auth_cache.items() if current_time - v["timestamp"] > CACHE_DURATION]
+        expired_keys = [k for k, v in auth_cache.items() if current_time >= v["expires_at"]]
         for key in expired_keys:
             del auth_cache[key]
 
@@ -342,7 +363,7 @@ def has_permission(user: AuthenticatedUser, section: str, action: str) -> bool:
 def require_permission(section: str, action: str):
     """Dependency to require specific permission"""
 
-    def permission_checker(user: AuthenticatedUser = Depends(authenticate_request)):
+    async def permission_checker(user: AuthenticatedUser = Depends(authenticate_request)):
         if not has_permission(user, section, action):
             logger.warning(
                 f"Permission denied for user {user.email} - Required: {section}.{action}, Is admin: {user.is_admin}, User permissions: {[f'{p.section}.{p.action}' for p in user.permissions]}"
@@ -369,7 +390,7 @@ def require_any_permission(*permissions):
             ("internal_keys", "create")
         )
     """
-    def permission_checker(user: AuthenticatedUser = Depends(authenticate_request)):
+    async def permission_checker(user: AuthenticatedUser = Depends(authenticate_request)):
         # Check if user has any of the required permissions
         has_any_permission = any(
             has_permission(user, section, action) 
@@ -3,9 +3,10 @@ Circuit Breaker Fallback Service
 Provides graceful degradation when database connections fail
 """
 import asyncio
+import hashlib
 import time
-import json
 import logging
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional, Union
 from ..config import settings
 
@@ -15,10 +16,50 @@ class CircuitBreakerFallback:
     """
     Provides fallback mechanisms when circuit breakers are open
     """
+
+    # Static parts of the fallback responses; each call only adds a timestamp
+    # and fresh copies of the mutable fields ("data", "details")
+    _RESERVATIONS_TEMPLATE = {
+        "count": 0,
+        "error": None,
+        "fallback": True,
+        "fallback_type": "reservations",
+        "message": "Reservations data temporarily unavailable. Showing cached data or empty results.",
+        "retry_after": 60
+    }
+    _PROPERTIES_TEMPLATE = {
+        "count": 0,
+        "error": None,
+        "fallback": True,
+        "fallback_type": "properties",
+        "message": "Properties data temporarily unavailable. Showing cached data or empty results.",
+        "retry_after": 60
+    }
+    _USERS_TEMPLATE = {
+        "count": 0,
+        "error": None,
+        "fallback": True,
+        "fallback_type": "users",
+        "message": "User data temporarily unavailable. Please try again in a moment.",
+        "retry_after": 30
+    }
+    _HEALTH_TEMPLATE = {
+        "status": "degraded",
+        "fallback": True,
+        "message": "Database connections are experiencing issues. Running in degraded mode.",
+        "retry_after": 30
+    }
+    _HEALTH_DETAILS = {
+        "database": "degraded",
+        "circuit_breaker": "open",
+        "fallback_active": True
+    }
     
     def __init__(self):
-        self.cache = {}
+        # LRU order: most recently used entries live at the end
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.cache_ttl = 300  # 5 minutes default TTL
+        self.max_entries = 1024
         self.fallback_responses = {
             "reservations": [],
             "properties": [],
@@ -32,9 +73,13 @@ class CircuitBreakerFallback:
             cached_item = self.cache[cache_key]
             if time.time() - cached_item['timestamp'] < self.cache_ttl:
                 logger.info(f"Returning cached response for {cache_key}")
-                cached_item['data']['_fallback_cached'] = True
-                cached_item['data']['_cached_at'] = cached_item['timestamp']
-                return cached_item['data']
+                self.cache.move_to_end(cache_key)
+                # Tag a shallow copy so the flags never leak into the cached payload
+                return {
+                    **cached_item['data'],
+                    '_fallback_cached': True,
+                    '_cached_at': cached_item['timestamp']
+                }
             else:
                 # Remove expired cache
                 del self.cache[cache_key]
@@ -50,6 +95,10 @@ class CircuitBreakerFallback:
                     'data': response,
                     'timestamp': time.time()
                 }
+                self.cache.move_to_end(cache_key)
+                # Evict least recently used entries beyond the cap
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
                 logger.debug(f"Cached response for {cache_key}")
         except Exception as e:
             logger.warning(f"Failed to cache response: {e}")
@@ -76,64 +125,41 @@ class CircuitBreakerFallback:
             return self._get_default_fallback(operation_type, params)
     
     def _generate_cache_key(self, operation_type: str, params: Dict[str, Any] = None) -> str:
-        """Generate a cache key for the operation"""
-        if params:
-            param_str = json.dumps(params, sort_keys=True)
-            return f"{operation_type}:{hash(param_str)}"
-        return operation_type
+        """Generate a cache key for the operation
+
+        Params are hashed straight into BLAKE2b rather than through a JSON dump
+        and hash(), which is salted per process. The separator bytes keep
+        ("ab", "c") and ("a", "bc") from producing the same digest.
+        """
+        if not params:
+            return operation_type
+        h = hashlib.blake2b(digest_size=16)
+        h.update(operation_type.encode())
+        for key in sorted(params):
+            h.update(b"\x00")
+            h.update(key.encode())
+            h.update(b"\x01")
+            h.update(repr(params[key]).encode())
+        return f"{operation_type}:{h.hexdigest()}"
     
     def _get_reservations_fallback(self, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Fallback response for reservations queries"""
-        return {
-            "data": [],
-            "count": 0,
-            "error": None,
-            "fallback": True,
-            "fallback_type": "reservations",
-            "message": "Reservations data temporarily unavailable. Showing cached data or empty results.",
-            "retry_after": 60,
-            "timestamp": time.time()
-        }
+        return {**self._RESERVATIONS_TEMPLATE, "data": [], "timestamp": time.time()}
     
     def _get_properties_fallback(self, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Fallback response for properties queries"""
-        return {
-            "data": [],
-            "count": 0,
-            "error": None,
-            "fallback": True,
-            "fallback_type": "properties",
-            "message": "Properties data temporarily unavailable. Showing cached data or empty results.",
-            "retry_after": 60,
-            "timestamp": time.time()
-        }
+        return {**self._PROPERTIES_TEMPLATE, "data": [], "timestamp": time.time()}
     
     def _get_users_fallback(self, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Fallback response for users queries"""
-        return {
-            "data": [],
-            "count": 0,
-            "error": None,
-            "fallback": True,
-            "fallback_type": "users",
-            "message": "User data temporarily unavailable. Please try again in a moment.",
-            "retry_after": 30,
-            "timestamp": time.time()
-        }
+        return {**self._USERS_TEMPLATE, "data": [], "timestamp": time.time()}
     
     def _get_health_fallback(self) -> Dict[str, Any]:
         """Fallback response for health checks"""
         return {
-            "status": "degraded",
-            "fallback": True,
-            "message": "Database connections are experiencing issues. Running in degraded mode.",
-            "retry_after": 30,
+            **self._HEALTH_TEMPLATE,
             "timestamp": time.time(),
-            "details": {
-                "database": "degraded",
-                "circuit_breaker": "open",
-                "fallback_active": True
-            }
+            "details": dict(self._HEALTH_DETAILS)
         }
     
     def _get_default_fallback(self, operation_type: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -170,6 +196,7 @@ class CircuitBreakerFallback:
             "total_entries": len(self.cache),
             "valid_entries": valid_entries,
             "expired_entries": expired_entries,
+            "max_entries": self.max_entries,
             "cache_ttl": self.cache_ttl,
             "last_cleanup": current_time
         }
@@ -12,6 +12,7 @@ Features:
 - Multi-device session management
 """
 
+import asyncio
 import logging
 import hashlib
 import json
@@ -23,8 +24,11 @@ from fastapi.security import HTTPBearer
 from sqlalchemy import Column, String, DateTime, Boolean, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session as DBSession
+from postgrest.types import ReturnMethod
 
 from ..database import supabase
+from .redis_client import redis_client
+from .async_supabase import executor as supabase_executor
 from ..models.auth import AuthenticatedUser
 from .auth import authenticate_request
 from .token_encryption import TokenEncryptionService
@@ -66,10 +70,26 @@ class PersistentSessionManager:
     SESSION_DURATION = timedelta(days=7)  # Sessions last 7 days
     MAX_SESSIONS_PER_USER = 10  # Maximum active sessions per user
     CLEANUP_INTERVAL = timedelta(hours=1)  # Run cleanup every hour
+    SESSION_CACHE_TTL = 300  # Seconds a session row stays in the Redis write-through cache
     
     # Initialize token encryption service
     _encryption_service = None
     
+    # Shared service-role client, bound once at startup (see main.lifespan)
+    _client = None
+    
+    @classmethod
+    def bind_client(cls, client) -> None:
+        """Bind the application-wide Supabase client used for all session queries"""
+        cls._client = client
+    
+    @classmethod
+    def sessions_table(cls):
+        """Query builder for the persistent_sessions table on the shared client"""
+        if cls._client is None:
+            cls._client = supabase.service
+        return cls._client.table('persistent_sessions')
+    
     @classmethod
     def get_encryption_service(cls) -> TokenEncryptionService:
         """Get or create token encryption service instance"""
@@ -118,6 +138,32 @@ class PersistentSessionManager:
             encrypted_data['tag']
         )
     
+    @staticmethod
+    async def _execute(query):
+        """Run a blocking PostgREST query on the shared, bounded Supabase executor
+        
+        All session queries go through the module-level service client and thread
+        pool, so concurrent requests share connections instead of blocking the
+        event loop or opening new ones.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(supabase_executor, query.execute)
+    
+    @staticmethod
+    def session_cache_key(user_id: str, session_id: str) -> str:
+        """Redis key for a cached session row (user-scoped so bulk logout can clear by pattern)"""
+        return f"persistent_session:{user_id}:{session_id}"
+    
+    @staticmethod
+    async def cache_session(session: Dict[str, Any]) -> None:
+        """Write a session row through to Redis"""
+        if redis_client.is_connected and session:
+            await redis_client.set(
+                PersistentSessionManager.session_cache_key(session['user_id'], session['session_id']),
+                session,
+                ttl=PersistentSessionManager.SESSION_CACHE_TTL
+            )
+    
     @staticmethod
     def generate_device_fingerprint(user_agent: str = None, ip_address: str = None) -> str:
         """Generate device fingerprint for additional security"""
@@ -182,15 +228,19 @@ class PersistentSessionManager:
             }
             
             # Store in Supabase (using persistent_sessions table)
-            result = supabase.service.table('persistent_sessions').insert(session_data).execute()
+            query = PersistentSessionManager.sessions_table().insert(session_data)
+            result = await PersistentSessionManager._execute(query)
             
             if not result.data:
                 raise Exception("Failed to create session in database")
             
             logger.info(f"Persistent session created successfully: {session_id}")
             
-            # Cleanup old sessions for this user
-            await PersistentSessionManager.cleanup_user_sessions(user_id)
+            # Cache write and old-session cleanup are independent; run them together
+            await asyncio.gather(
+                PersistentSessionManager.cache_session(result.data[0]),
+                PersistentSessionManager.cleanup_user_sessions(user_id)
+            )
             
             return result.data[0]
             
@@ -212,16 +262,25 @@ class PersistentSessionManager:
         try:
             logger.info(f"Validating persistent session: {session_id}")
             
-            # Get session from database
-            result = supabase.service.table('persistent_sessions').select(
-                '*'
-            ).eq('session_id', session_id).eq('is_active', True).execute()
-            
-            if not result.data:
-                logger.warning(f"Session not found: {session_id}")
-                return {'valid': False, 'reason': 'session_not_found'}
-            
-            session = result.data[0]
+            # Serve from the Redis write-through cache, falling back to the database
+            session = None
+            if redis_client.is_connected:
+                session = await redis_client.get(
+                    PersistentSessionManager.session_cache_key(user_id, session_id)
+                )
+            from_cache = session is not None
+            
+            if not from_cache:
+                query = PersistentSessionManager.sessions_table().select(
+                    '*'
+                ).eq('session_id', session_id).eq('is_active', True)
+                result = await PersistentSessionManager._execute(query)
+                
+                if not result.data:
+                    logger.warning(f"Session not found: {session_id}")
+                    return {'valid': False, 'reason': 'session_not_found'}
+                
+                session = result.data[0]
             
             # Validate session ownership
             if session['user_id'] != user_id:
@@ -238,7 +297,7 @@ class PersistentSessionManager:
             if datetime.utcnow() > expires_at:
                 logger.warning(f"Session expired: {session_id}")
                 # Mark session as inactive
-                await PersistentSessionManager.deactivate_session(session_id)
+                await PersistentSessionManager.deactivate_session(session_id, user_id=user_id)
                 return {'valid': False, 'reason': 'session_expired'}
             
             # Validate access token if provided
@@ -258,8 +317,11 @@ class PersistentSessionManager:
                         logger.warning(f"Session token mismatch (hash): {session_id}")
                         return {'valid': False, 'reason': 'token_mismatch'}
             
-            # Update last activity
-            await PersistentSessionManager.update_session_activity(session_id)
+            # Update last activity; cache hits skip the write, so last_activity
+            # may lag by up to SESSION_CACHE_TTL
+            if not from_cache:
+                await PersistentSessionManager.update_session_activity(session_id)
+                await PersistentSessionManager.cache_session(session)
             
             logger.info(f"Session validated successfully: {session_id}")
             return {
@@ -277,9 +339,10 @@ class PersistentSessionManager:
     async def update_session_activity(session_id: str) -> bool:
         """Update session last activity timestamp"""
         try:
-            result = supabase.service.table('persistent_sessions').update({
+            query = PersistentSessionManager.sessions_table().update({
                 'last_activity': datetime.utcnow().isoformat()
-            }).eq('session_id', session_id).eq('is_active', True).execute()
+            }).eq('session_id', session_id).eq('is_active', True)
+            result = await PersistentSessionManager._execute(query)
             
             return len(result.data) > 0
             
@@ -307,11 +370,14 @@ class PersistentSessionManager:
                 refresh_token_encrypted = PersistentSessionManager.encrypt_token(new_refresh_token)
                 update_data['refresh_token_hash'] = json.dumps(refresh_token_encrypted)
             
-            result = supabase.service.table('persistent_sessions').update(
+            query = PersistentSessionManager.sessions_table().update(
                 update_data
-            ).eq('session_id', session_id).eq('is_active', True).execute()
+            ).eq('session_id', session_id).eq('is_active', True)
+            result = await PersistentSessionManager._execute(query)
             
             logger.info(f"Session tokens updated: {session_id}")
+            if result.data:
+                await PersistentSessionManager.cache_session(result.data[0])
             return len(result.data) > 0
             
         except Exception as e:
@@ -319,13 +385,58 @@ class PersistentSessionManager:
             return False
     
     @staticmethod
-    async def deactivate_session(session_id: str) -> bool:
-        """Deactivate a specific session"""
+    async def extend_session(session_id: str, new_access_token: str) -> Optional[Dict[str, Any]]:
+        """Store a refreshed access token and push the session expiry out by SESSION_DURATION
+        
+        Returns the updated session row, or None if the session is gone or the update failed.
+        """
         try:
-            result = supabase.service.table('persistent_sessions').update({
+            now = datetime.utcnow()
+            update_data = {
+                'access_token_hash': json.dumps(PersistentSessionManager.encrypt_token(new_access_token)),
+                'last_activity': now.isoformat(),
+                'expires_at': (now + PersistentSessionManager.SESSION_DURATION).isoformat()
+            }
+            
+            query = PersistentSessionManager.sessions_table().update(
+                update_data
+            ).eq('session_id', session_id).eq('is_active', True)
+            result = await PersistentSessionManager._execute(query)
+            
+            if not result.data:
+                return None
+            
+            logger.info(f"Session extended: {session_id}")
+            await PersistentSessionManager.cache_session(result.data[0])
+            return result.data[0]
+            
+        except Exception as e:
+            logger.error(f"Error extending session {session_id}: {str(e)}")
+            return None
+    
+    @staticmethod
+    async def deactivate_session(session_id: str, user_id: str = None) -> bool:
+        """Deactivate a specific session
+        
+        When user_id is given, ownership and active state are enforced in the
+        same UPDATE, so no separate validation round-trip is needed.
+        """
+        try:
+            query = PersistentSessionManager.sessions_table().update({
                 'is_active': False,
                 'last_activity': datetime.utcnow().isoformat()
-            }).eq('session_id', session_id).execute()
+            }).eq('session_id', session_id)
+            
+            if user_id:
+                query = query.eq('user_id', user_id).eq('is_active', True)
+            
+            result = await PersistentSessionManager._execute(query)
+            
+            if redis_client.is_connected:
+                if user_id:
+                    await redis_client.delete(PersistentSessionManager.session_cache_key(user_id, session_id))
+                else:
+                    await redis_client.clear_pattern(PersistentSessionManager.session_cache_key('*', session_id))
             
             logger.info(f"Session deactivated: {session_id}")
             return len(result.data) > 0
@@ -336,19 +447,28 @@ class PersistentSessionManager:
     
     @staticmethod
     async def deactivate_user_sessions(user_id: str, exclude_session_id: str = None) -> int:
-        """Deactivate all sessions for a user (except optionally one)"""
+        """Deactivate all sessions for a user (except optionally one)
+        
+        Runs as a single UPDATE; the affected row count comes back in the
+        response header, so the session rows themselves are not returned.
+        """
         try:
-            query = supabase.service.table('persistent_sessions').update({
+            query = PersistentSessionManager.sessions_table().update({
                 'is_active': False,
                 'last_activity': datetime.utcnow().isoformat()
-            }).eq('user_id', user_id).eq('is_active', True)
+            }, count='exact', returning=ReturnMethod.minimal).eq('user_id', user_id).eq('is_active', True)
             
             if exclude_session_id:
                 query = query.neq('session_id', exclude_session_id)
             
-            result = query.execute()
+            result = await PersistentSessionManager._execute(query)
+            
+            # Drop all cached rows for the user; an excluded session is simply
+            # re-read from the database on its next validation
+            if redis_client.is_connected:
+                await redis_client.clear_pattern(PersistentSessionManager.session_cache_key(user_id, '*'))
             
-            deactivated_count = len(result.data)
+            deactivated_count = result.count or 0
             logger.info(f"Deactivated {deactivated_count} sessions for user {user_id}")
             return deactivated_count
             
@@ -361,11 +481,12 @@ class PersistentSessionManager:
         """Clean up old/excess sessions for a user"""
         try:
             # Get active sessions for user, ordered by last activity (newest first)
-            result = supabase.service.table('persistent_sessions').select(
+            query = PersistentSessionManager.sessions_table().select(
                 'session_id'
             ).eq('user_id', user_id).eq('is_active', True).order(
                 'last_activity', desc=True
-            ).execute()
+            )
+            result = await PersistentSessionManager._execute(query)
             
             active_sessions = result.data
             
@@ -376,7 +497,7 @@ class PersistentSessionManager:
                 
                 # Deactivate excess sessions
                 for session_id in session_ids_to_deactivate:
-                    await PersistentSessionManager.deactivate_session(session_id)
+                    await PersistentSessionManager.deactivate_session(session_id, user_id=user_id)
                 
                 logger.info(f"Cleaned up {len(session_ids_to_deactivate)} excess sessions for user {user_id}")
                 return len(session_ids_to_deactivate)
@@ -394,18 +515,19 @@ class PersistentSessionManager:
             current_time = datetime.utcnow().isoformat()
             
             # Get expired active sessions
-            result = supabase.service.table('persistent_sessions').select(
-                'session_id'
-            ).eq('is_active', True).lt('expires_at', current_time).execute()
+            query = PersistentSessionManager.sessions_table().select(
+                'session_id, user_id'
+            ).eq('is_active', True).lt('expires_at', current_time)
+            result = await PersistentSessionManager._execute(query)
             
             expired_sessions = result.data
             
             if expired_sessions:
                 # Deactivate expired sessions
-                session_ids = [s['session_id'] for s in expired_sessions]
-                
-                for session_id in session_ids:
-                    await PersistentSessionManager.deactivate_session(session_id)
+                for expired in expired_sessions:
+                    await PersistentSessionManager.deactivate_session(
+                        expired['session_id'], user_id=expired['user_id']
+                    )
                 
                 logger.info(f"Cleaned up {len(expired_sessions)} expired sessions")
                 return len(expired_sessions)
@@ -420,14 +542,14 @@ class PersistentSessionManager:
     async def get_user_sessions(user_id: str, active_only: bool = True) -> List[Dict[str, Any]]:
         """Get all sessions for a user"""
         try:
-            query = supabase.service.table('persistent_sessions').select(
+            query = PersistentSessionManager.sessions_table().select(
                 'session_id, device_id, created_at, last_activity, expires_at, is_active, user_agent, ip_address'
             ).eq('user_id', user_id)
             
             if active_only:
                 query = query.eq('is_active', True)
             
-            result = query.order('last_activity', desc=True).execute()
+            result = await PersistentSessionManager._execute(query.order('last_activity', desc=True))
             
             return result.data
             
@@ -435,6 +557,16 @@ class PersistentSessionManager:
             logger.error(f"Error getting user sessions {user_id}: {str(e)}")
             return []
 
+async def run_periodic_session_cleanup():
+    """Background loop that deactivates expired sessions every CLEANUP_INTERVAL"""
+    interval = PersistentSessionManager.CLEANUP_INTERVAL.total_seconds()
+    while True:
+        try:
+            await PersistentSessionManager.cleanup_expired_sessions()
+        except Exception as e:
+            logger.error(f"Error in periodic session cleanup: {str(e)}")
+        await asyncio.sleep(interval)
+
 # Session validation endpoint dependencies
 security = HTTPBearer(auto_error=False)
 
@@ -1,3 +1,4 @@
+import asyncio
 import redis.asyncio as redis
 import json
 import logging
@@ -69,13 +70,14 @@ class RedisClient:
         """Check if Redis client is connected"""
         return self.redis_client is not None
     
-    def _serialize_data(self, data: Any) -> bytes:
+    def _serialize_data(self, data: Any, compression_level: int = 0) -> bytes:
         """Serialize data with compression for optimal storage"""
         try:
             # Use orjson for faster JSON serialization
             json_data = orjson.dumps(data)
-            # Compress with LZ4 for speed
-            compressed_data = lz4.frame.compress(json_data)
+            # Compress with LZ4 for speed; HC levels trade write time for smaller
+            # payloads while decompression speed stays the same
+            compressed_data = lz4.frame.compress(json_data, compression_level=compression_level)
             return compressed_data
         except Exception as e:
             logger.error(f"Serialization error: {e}")
@@ -106,6 +108,22 @@ class RedisClient:
             logger.error(f"Redis GET error for key {key}: {e}")
             return None
     
+    async def get_offloaded(self, key: str) -> Optional[Any]:
+        """Get a large value, decompressing and parsing it in a worker thread
+        so big payloads don't block the event loop"""
+        if not self.redis_client:
+            return None
+
+        try:
+            data = await self.redis_client.get(key)
+            if data:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, self._deserialize_data, data)
+            return None
+        except Exception as e:
+            logger.error(f"Redis GET error for key {key}: {e}")
+            return None
+
     async def set(self, key: str, value: Any, ttl: int = 300) -> bool:
         """Set value in Redis with compression and TTL"""
         if not self.redis_client:
@@ -133,6 +151,40 @@ class RedisClient:
             logger.error(f"Redis DELETE error for key {key}: {e}")
             return False
     
+    async def acquire_lock(self, key: str, ttl: int = 30) -> bool:
+        """Try to take a short-lived lock (SET NX EX); True if this caller won it"""
+        if not self.redis_client:
+            return False
+
+        try:
+            return bool(await self.redis_client.set(key, b"1", nx=True, ex=ttl))
+        except Exception as e:
+            logger.error(f"Redis LOCK error for key {key}: {e}")
+            return False
+
+    async def incr(self, key: str) -> Optional[int]:
+        """Atomically increment an integer counter, creating it at 1"""
+        if not self.redis_client:
+            return None
+
+        try:
+            return await self.redis_client.incr(key)
+        except Exception as e:
+            logger.error(f"Redis INCR error for key {key}: {e}")
+            return None
+
+    async def get_counter(self, key: str) -> int:
+        """Read an integer counter written by incr; 0 when unset"""
+        if not self.redis_client:
+            return 0
+
+        try:
+            value = await self.redis_client.get(key)
+            return int(value) if value else 0
+        except Exception as e:
+            logger.error(f"Redis GET counter error for key {key}: {e}")
+            return 0
+
     async def exists(self, key: str) -> bool:
         """Check if key exists in Redis"""
         if not self.redis_client:
@@ -159,6 +211,104 @@ class RedisClient:
             logger.error(f"Redis CLEAR_PATTERN error for pattern {pattern}: {e}")
             return 0
     
+    async def set_many(self, key_ttls: dict, value: Any, compression_level: int = 0) -> bool:
+        """Store one value under several keys (key -> ttl), serializing it only once"""
+        if not self.redis_client or not key_ttls:
+            return False
+
+        try:
+            serialized_data = self._serialize_data(value, compression_level)
+            if not serialized_data:
+                return False
+            pipe = self.redis_client.pipeline()
+            for key, ttl in key_ttls.items():
+                pipe.setex(key, ttl, serialized_data)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis SET_MANY error: {e}")
+            return False
+
+    async def mget(self, keys: list) -> list:
+        """Get multiple values in one round-trip; missing keys come back as None"""
+        if not self.redis_client or not keys:
+            return [None] * len(keys)
+
+        try:
+            values = await self.redis_client.mget(keys)
+            return [self._deserialize_data(value) if value else None for value in values]
+        except Exception as e:
+            logger.error(f"Redis MGET error: {e}")
+            return [None] * len(keys)
+
+    async def hset_many(self, key: str, mapping: dict, ttl: int = 300) -> bool:
+        """Replace a hash with the given fields and set its TTL
+
+        Hash fields are small per-row values, so they are stored as plain orjson:
+        an LZ4 frame header alone would outweigh anything it saves on them.
+        """
+        if not self.redis_client:
+            return False
+
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.delete(key)
+            if mapping:
+                pipe.hset(key, mapping={
+                    field: orjson.dumps(value) for field, value in mapping.items()
+                })
+                pipe.expire(key, ttl)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis HSET error for key {key}: {e}")
+            return False
+
+    async def hget(self, key: str, field: str) -> Optional[Any]:
+        """Get a single hash field written by hset/hset_many"""
+        if not self.redis_client:
+            return None
+
+        try:
+            value = await self.redis_client.hget(key, field)
+            return orjson.loads(value) if value else None
+        except Exception as e:
+            logger.error(f"Redis HGET error for key {key}: {e}")
+            return None
+
+    async def hset(self, key: str, field: str, value: Any, ttl: int = 300) -> bool:
+        """Set one hash field, keeping the rest, and refresh the hash TTL"""
+        if not self.redis_client:
+            return False
+
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hset(key, field, orjson.dumps(value))
+            pipe.expire(key, ttl)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis HSET error for key {key}: {e}")
+            return False
+
+    async def hmget(self, key: str, fields: list) -> list:
+        """Get selected hash fields in one round-trip; missing fields come back as None"""
+        if not self.redis_client or not fields:
+            return [None] * len(fields)
+
+        try:
+            values = await self.redis_client.hmget(key, fields)
+            return [orjson.loads(value) if value else None for value in values]
+        except Exception as e:
+            logger.error(f"Redis HMGET error for key {key}: {e}")
+            return [None] * len(fields)
+
+    def pipeline(self, transaction: bool = False):
+        """Return a raw redis-py pipeline for batching commands, or None when disconnected"""
+        if not self.redis_client:
+            return None
+        return self.redis_client.pipeline(transaction=transaction)
+
     async def pipeline_set(self, data: dict, ttl: int = 300) -> bool:
         """Set multiple keys using pipeline for better performance"""
         if not self.redis_client or not data:
@@ -9,10 +9,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+import contextlib
 from contextlib import asynccontextmanager
 import logging
+import logging.handlers
 import os
 import time
+from queue import Queue
 
 from app.core.redis_client import redis_client
 from .api.v1 import (
@@ -41,10 +44,19 @@ logger = logging.getLogger(__name__)
 async def cache_invalidation_listener():
     """
     Background task to listen for cache invalidation messages from Redis Pub/Sub.
-    When a message is received, it invalidates the auth cache for the specified user.
+    When a message is received, it invalidates the auth cache (or the persistent
+    session validation cache) for the specified user.
     This ensures cache invalidation works across all worker processes.
     """
     from .core.auth import invalidate_user_cache
+    from .api.v1.persistent_auth import (
+        SESSION_CACHE_INVALIDATE_CHANNEL,
+        invalidate_session_validation_cache,
+    )
+    from .api.v1.users_lightning import (
+        TENANT_CACHE_INVALIDATE_CHANNEL,
+        invalidate_tenant_cities_cache,
+    )
 
     if not redis_client.is_connected:
         logger.info("Redis not connected - cache invalidation listener will not start")
@@ -56,8 +68,11 @@ async def cache_invalidation_listener():
         if not pubsub:
             logger.warning("Failed to subscribe to auth_cache_invalidate channel")
             return
+        await pubsub.subscribe(SESSION_CACHE_INVALIDATE_CHANNEL, TENANT_CACHE_INVALIDATE_CHANNEL)
 
-        logger.info("✅ Cache invalidation listener started - listening on auth_cache_invalidate channel")
+        logger.info(
+            f"✅ Cache invalidation listener started - listening on auth_cache_invalidate, {SESSION_CACHE_INVALIDATE_CHANNEL} and {TENANT_CACHE_INVALIDATE_CHANNEL} channels"
+        )
 
         # Listen for messages indefinitely
         async for message in pubsub.listen():
@@ -67,7 +82,22 @@ async def cache_invalidation_listener():
                     if isinstance(user_id, bytes):
                         user_id = user_id.decode('utf-8')
 
-                    if user_id:
+                    channel = message.get("channel")
+                    if isinstance(channel, bytes):
+                        channel = channel.decode('utf-8')
+
+                    if user_id and channel == TENANT_CACHE_INVALIDATE_CHANNEL:
+                        # Message carries a tenant id for this channel
+                        invalidated_count = invalidate_tenant_cities_cache(user_id)
+                        logger.info(f"🔄 Received tenant cache invalidation for tenant {user_id} - cleared {invalidated_count} entries in this worker")
+                    elif user_id and channel == SESSION_CACHE_INVALIDATE_CHANNEL:
+                        # "<user_id>" covers every session, "<user_id>:<session_id>" just one
+                        user_id, _, session_id = user_id.partition(":")
+                        # Logging out also drops the user's cached authentications
+                        invalidate_user_cache(user_id)
+                        invalidated_count = invalidate_session_validation_cache(user_id, session_id or None)
+                        logger.info(f"🔄 Received session cache invalidation for user {user_id} - cleared {invalidated_count} entries in this worker")
+                    elif user_id:
                         # Invalidate cache for this user in the current worker
                         invalidated_count = invalidate_user_cache(user_id)
                         logger.info(f"🔄 Received cache invalidation for user {user_id} - cleared {invalidated_count} entries in this worker")
@@ -79,15 +109,38 @@ async def cache_invalidation_listener():
     finally:
         try:
             if pubsub:
-                await pubsub.unsubscribe("auth_cache_invalidate")
+                await pubsub.unsubscribe(
+                    "auth_cache_invalidate", SESSION_CACHE_INVALIDATE_CHANNEL, TENANT_CACHE_INVALIDATE_CHANNEL
+                )
                 await pubsub.close()
         except:
             pass
 
 
+def start_queued_logging() -> logging.handlers.QueueListener:
+    """
+    Move the configured root handlers behind a queue so handler I/O (e.g. the
+    health probes hit at orchestrator cadence) stays off the request path.
+    The listener thread writes through the same handlers, formatters and levels.
+    """
+    root = logging.getLogger()
+    log_queue: Queue = Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+def stop_queued_logging(listener: logging.handlers.QueueListener) -> None:
+    """Flush the queue and put the original root handlers back"""
+    listener.stop()
+    logging.getLogger().handlers = list(listener.handlers)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    log_listener = start_queued_logging()
     logger.info("Starting up...")
 
     # Initialize Supabase connection pool
@@ -100,6 +153,13 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Supabase connection pool initialization failed: {e}")
         # Continue startup - fallback to direct connections
 
+    # Share one service-role Supabase client across the app (keep-alive connections are reused)
+    from .database import supabase
+    from .core.persistent_sessions import PersistentSessionManager
+
+    app.state.supabase = supabase.service
+    PersistentSessionManager.bind_client(app.state.supabase)
+
     # Initialize Redis connection with timeout
     try:
         await redis_client.initialize()
@@ -119,10 +179,19 @@ async def lifespan(app: FastAPI):
     async_processor.start_background_cleanup()
     logger.info("Async processor background cleanup started")
 
+    # Start hourly expired persistent session cleanup
+    from .core.persistent_sessions import run_periodic_session_cleanup
+    session_cleanup_task = asyncio.create_task(run_periodic_session_cleanup())
+    logger.info("Persistent session cleanup task started")
+
     yield
     # Shutdown
     logger.info("Shutting down...")
 
+    session_cleanup_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await session_cleanup_task
+
     # Shutdown async processor
     await async_processor.shutdown()
     logger.info("Async processor shutdown completed")
@@ -136,6 +205,8 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️ Error closing connection pool: {e}")
 
+    stop_queued_logging(log_listener)
+
 
 app = FastAPI(
     title="Auth Skeleton API",
@@ -305,8 +376,6 @@ async def reset_circuit_breaker():
         # Reset async supabase connection tracker
         connection_tracker.failed_connections = 0
         connection_tracker.last_failure = None
-        connection_tracker.retry_counts.clear()
-        connection_tracker.operation_timeouts.clear()
 
         logger.info("Circuit breakers have been manually reset")
 
@@ -339,7 +408,7 @@ async def circuit_breaker_status():
                 "failed_connections": connection_tracker.failed_connections,
                 "last_failure": connection_tracker.last_failure,
                 "should_throttle": connection_tracker.should_throttle(),
-                "active_retry_operations": len(connection_tracker.retry_counts),
+                "active_retry_operations": connection_tracker.active_retries,
                 "failure_threshold": connection_tracker.failure_threshold,
                 "throttle_duration": connection_tracker.throttle_duration,
             },
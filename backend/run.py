@@ -6,5 +6,8 @@ if __name__ == "__main__":
         app,
         host="0.0.0.0",
         port=8000,
-        reload=False
+        reload=False,
+        # uvicorn[standard] ships uvloop; "auto" uses it and falls back to
+        # asyncio where it isn't available (Windows)
+        loop="auto",
     )